@@ -1,8 +1,20 @@
 import os
+import argparse
+import hashlib
+import heapq
+import json
+import queue
+import sqlite3
 import subprocess
 import shutil
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 try:
     from tqdm import tqdm
@@ -10,6 +22,312 @@ try:
 except ImportError:
     HAS_TQDM = False
 
+try:
+    import yaml
+    HAS_YAML = True
+except ImportError:
+    HAS_YAML = False
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    HAS_WATCHDOG = True
+except ImportError:
+    HAS_WATCHDOG = False
+
+AUDIO_EXTENSIONS = {'.wav', '.mp3', '.flac', '.aac', '.ogg', '.m4a', '.wma'}
+
+# Rough bytes per second of audio for each input format, used to estimate the
+# duration of files that haven't been probed yet
+BYTES_PER_SECOND = {
+    '.wav': 176400,
+    '.flac': 100000,
+    '.mp3': 24000,
+    '.aac': 24000,
+    '.ogg': 24000,
+    '.m4a': 24000,
+    '.wma': 24000,
+}
+
+# Assumed wall-clock seconds per second of audio until a run has measured better
+DEFAULT_ENCODE_SPEED = 1.0
+DEFAULT_COPY_SPEED = 0.01
+DEFAULT_ANALYSIS_SPEED = 0.05
+
+# Seconds without progress from FFmpeg before a conversion is reported as stalled
+STALL_SECONDS = 60
+
+# EBU R128 loudness normalization: default integrated loudness (LUFS), and the
+# true peak (dBTP) and loudness range (LU) used with every target
+DEFAULT_LOUDNESS = -16.0
+LOUDNORM_TRUE_PEAK = -1.5
+LOUDNORM_RANGE = 11.0
+
+# loudnorm resamples to 192 kHz internally; outputs without a sample rate get this one
+# unless the source's rate is known from ffprobe
+LOUDNORM_SAMPLE_RATE = "48000"
+
+def log(message: str) -> None:
+    """Print a message without breaking the progress bar."""
+    if HAS_TQDM:
+        tqdm.write(message)
+    else:
+        print(message)
+
+def default_workers() -> int:
+    """Number of parallel conversions to run by default (one per CPU core)."""
+    return os.cpu_count() or 1
+
+def threads_per_worker(workers: int) -> int:
+    """Split the CPU cores between parallel conversions so FFmpeg doesn't oversubscribe them."""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+def ask_yes_no(prompt: str) -> bool:
+    """Ask a y/n question until the user gives a valid answer."""
+    while True:
+        answer = input(f"{prompt} (y/n): ").strip().lower()
+        if answer in ('y', 'yes', 'n', 'no'):
+            return answer in ('y', 'yes')
+        print("Please enter 'y' or 'n'.")
+
+def file_hash(file_path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+MANIFEST_FILENAME = ".audio-converter-manifest.db"
+
+class ConversionManifest:
+    """SQLite record of finished conversions, stored in the destination folder.
+    
+    Each output is keyed on its source path, size and mtime (plus a content
+    hash when enabled) and on the FFmpeg encoding arguments that produced it,
+    so re-runs only re-encode sources or settings that actually changed.
+    """
+    
+    def __init__(self, dest_path: str, commit_every: int = 50):
+        self.dest_path = Path(dest_path)
+        self.commit_every = commit_every
+        self.pending = 0
+        self.conn = sqlite3.connect(str(self.dest_path / MANIFEST_FILENAME))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS outputs ("
+            "output TEXT PRIMARY KEY, source TEXT NOT NULL, size INTEGER NOT NULL, "
+            "mtime_ns INTEGER NOT NULL, hash TEXT, params TEXT NOT NULL)"
+        )
+        self.conn.commit()
+    
+    def _key(self, output_path: Path) -> str:
+        """Outputs are stored relative to the destination so the folder can be moved."""
+        return os.path.relpath(output_path, self.dest_path)
+    
+    def source_state(self, file_path: Path, use_hash: bool = False) -> Tuple[int, int, Optional[str]]:
+        """Return (size, mtime_ns, hash) for a source; hash is None unless hashing is enabled."""
+        stat = file_path.stat()
+        digest = file_hash(file_path) if use_hash else None
+        return stat.st_size, stat.st_mtime_ns, digest
+    
+    def has_entry(self, output_path: Path) -> bool:
+        """Check whether the output was produced by a previous run."""
+        row = self.conn.execute("SELECT 1 FROM outputs WHERE output = ?", (self._key(output_path),)).fetchone()
+        return row is not None
+    
+    def is_up_to_date(self, output_path: Path, file_path: Path,
+                      state: Tuple[int, int, Optional[str]], params: str) -> bool:
+        """Check whether the output was made from this exact source with these settings."""
+        if not output_path.exists():
+            return False
+        row = self.conn.execute(
+            "SELECT source, size, mtime_ns, hash, params FROM outputs WHERE output = ?",
+            (self._key(output_path),)
+        ).fetchone()
+        if row is None or row[0] != str(file_path) or row[4] != params:
+            return False
+        size, mtime_ns, digest = state
+        if digest is not None and row[3]:
+            # Content decides; a touched but identical file is still up to date
+            return row[3] == digest
+        return (row[1], row[2]) == (size, mtime_ns)
+    
+    def record(self, output_path: Path, file_path: Path,
+               state: Tuple[int, int, Optional[str]], params: str) -> None:
+        """Remember a successful conversion."""
+        size, mtime_ns, digest = state
+        self.conn.execute(
+            "INSERT OR REPLACE INTO outputs (output, source, size, mtime_ns, hash, params) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (self._key(output_path), str(file_path), size, mtime_ns, digest, params)
+        )
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.conn.commit()
+            self.pending = 0
+    
+    def close(self) -> None:
+        """Flush pending records and close the database."""
+        self.conn.commit()
+        self.conn.close()
+
+def cache_dir() -> Path:
+    """Per-user folder for caches that are shared between runs and destinations."""
+    base = os.environ.get("LOCALAPPDATA") if os.name == "nt" else os.environ.get("XDG_CACHE_HOME")
+    return Path(base) / "audio-converter" if base else Path.home() / ".cache" / "audio-converter"
+
+class AudioCache:
+    """SQLite cache of facts about source files, keyed by path, size and mtime.
+    
+    Unlike the manifest it doesn't depend on the destination, so converting the
+    same library to several places still only probes each source once.
+    """
+    
+    def __init__(self, path: Optional[Path] = None):
+        path = path or cache_dir() / "cache.db"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS probes ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, info TEXT NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS speeds ("
+            "settings TEXT PRIMARY KEY, seconds_per_second REAL NOT NULL, samples INTEGER NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, partial TEXT, full TEXT)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS loudness ("
+            "hash TEXT NOT NULL, target REAL NOT NULL, measured TEXT NOT NULL, PRIMARY KEY (hash, target))"
+        )
+        self.conn.commit()
+        self.speeds = {}
+    
+    def get_probe(self, file_path: Path, size: int, mtime_ns: int) -> Optional[Dict]:
+        """Return cached ffprobe results, or None if the file changed or was never probed."""
+        row = self.conn.execute(
+            "SELECT info FROM probes WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (str(file_path), size, mtime_ns)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def store_probe(self, file_path: Path, size: int, mtime_ns: int, info: Dict) -> None:
+        """Cache ffprobe results for a file."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO probes (path, size, mtime_ns, info) VALUES (?, ?, ?, ?)",
+            (str(file_path), size, mtime_ns, json.dumps(info))
+        )
+    
+    def get_hashes(self, file_path: Path, size: int, mtime_ns: int) -> Dict[str, Optional[str]]:
+        """Return the cached head/tail and full content hashes of a file, if it hasn't changed."""
+        row = self.conn.execute(
+            "SELECT partial, full FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (str(file_path), size, mtime_ns)
+        ).fetchone()
+        return {"partial": row[0], "full": row[1]} if row else {"partial": None, "full": None}
+    
+    def store_hashes(self, file_path: Path, size: int, mtime_ns: int, hashes: Dict[str, Optional[str]]) -> None:
+        """Cache the content hashes computed for a file."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, partial, full) VALUES (?, ?, ?, ?, ?)",
+            (str(file_path), size, mtime_ns, hashes["partial"], hashes["full"])
+        )
+    
+    def get_loudness(self, target: float) -> Dict[str, Dict]:
+        """Return every cached loudnorm measurement for a target loudness, keyed by content hash."""
+        rows = self.conn.execute("SELECT hash, measured FROM loudness WHERE target = ?", (target,))
+        return {digest: json.loads(measured) for digest, measured in rows}
+    
+    def store_loudness(self, digest: str, target: float, measured: Dict) -> None:
+        """Cache a loudnorm measurement, which only depends on the audio content and the target."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO loudness (hash, target, measured) VALUES (?, ?, ?)",
+            (digest, target, json.dumps(measured))
+        )
+    
+    def get_speed(self, settings: str) -> Optional[float]:
+        """Return the measured wall-clock seconds per audio second for a set of outputs."""
+        if settings not in self.speeds:
+            row = self.conn.execute(
+                "SELECT seconds_per_second, samples FROM speeds WHERE settings = ?", (settings,)
+            ).fetchone()
+            self.speeds[settings] = tuple(row) if row else None
+        entry = self.speeds[settings]
+        return entry[0] if entry else None
+    
+    def record_speed(self, settings: str, seconds_per_second: float) -> None:
+        """Fold one measured conversion into the running average for its settings."""
+        self.get_speed(settings)
+        average, samples = self.speeds[settings] or (seconds_per_second, 0)
+        # Cap the weight of history so the average follows hardware or FFmpeg upgrades
+        samples = min(samples + 1, 50)
+        average += (seconds_per_second - average) / samples
+        self.speeds[settings] = (average, samples)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO speeds (settings, seconds_per_second, samples) VALUES (?, ?, ?)",
+            (settings, average, samples)
+        )
+    
+    def close(self) -> None:
+        """Flush pending entries and close the database."""
+        self.conn.commit()
+        self.conn.close()
+
+def partial_hash(file_path: Path, size: int, chunk_size: int = 64 * 1024) -> str:
+    """SHA-256 of the first and last chunk of a file, a cheap first check for identical content."""
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        sha256.update(f.read(chunk_size))
+        if size > chunk_size:
+            f.seek(max(chunk_size, size - chunk_size))
+            sha256.update(f.read(chunk_size))
+    return sha256.hexdigest()
+
+class ContentIndex:
+    """Finds sources with byte-identical content within a job.
+    
+    Files are grouped by size first; only when sizes collide are a head/tail
+    hash and then a full hash computed, and both are kept in the AudioCache so
+    later runs don't read the files again.
+    """
+    
+    def __init__(self, cache: AudioCache):
+        self.cache = cache
+        self.by_size = {}  # size -> entries (tasks, or stand-ins for sources with nothing to convert)
+        self.hashes = {}
+    
+    def _hash(self, entry: Dict, kind: str) -> str:
+        file_path = entry["source"]
+        size, mtime_ns, digest = entry["state"]
+        if file_path not in self.hashes:
+            self.hashes[file_path] = self.cache.get_hashes(file_path, size, mtime_ns)
+            # Incremental mode with hashing has already read the whole file
+            self.hashes[file_path]["full"] = self.hashes[file_path]["full"] or digest
+        hashes = self.hashes[file_path]
+        if hashes[kind] is None:
+            hashes[kind] = partial_hash(file_path, size) if kind == "partial" else file_hash(file_path)
+            self.cache.store_hashes(file_path, size, mtime_ns, hashes)
+        return hashes[kind]
+    
+    def find(self, entry: Dict) -> Optional[Dict]:
+        """Return an earlier entry with the same content, or None."""
+        size = entry["state"][0]
+        if size == 0:
+            return None
+        for candidate in self.by_size.get(size, []):
+            if (self._hash(candidate, "partial") == self._hash(entry, "partial")
+                    and self._hash(candidate, "full") == self._hash(entry, "full")):
+                return candidate
+        return None
+    
+    def add(self, entry: Dict) -> None:
+        """Register a source (a dict with "source", "state" and "name") as a dedup candidate."""
+        self.by_size.setdefault(entry["state"][0], []).append(entry)
+
+@lru_cache(maxsize=None)
 def check_ffmpeg() -> bool:
     """Check if FFmpeg is available in the system."""
     try:
@@ -18,16 +336,115 @@ def check_ffmpeg() -> bool:
     except (subprocess.CalledProcessError, FileNotFoundError):
         return False
 
-def get_audio_files(source_path: str, mode: str) -> List[Path]:
-    """Get audio files based on mode and automatically detect formats."""
-    audio_extensions = {'.wav', '.mp3', '.flac', '.aac', '.ogg', '.m4a', '.wma'}
+@lru_cache(maxsize=None)
+def check_ffprobe() -> bool:
+    """Check if ffprobe (shipped alongside FFmpeg) is available."""
+    return shutil.which("ffprobe") is not None
+
+# Codec FFmpeg picks by default for each output format; a source already in
+# that codec can be remuxed instead of re-encoded
+TARGET_CODECS = {
+    '.mp3': 'mp3',
+    '.aac': 'aac',
+    '.m4a': 'aac',
+    '.flac': 'flac',
+    '.ogg': 'vorbis',
+    '.wav': 'pcm_s16le',
+}
+
+STREAM_COPY_ARGS = ["-map_metadata", "0", "-c:a", "copy"]
+
+def parse_number(value, convert):
+    """Convert an ffprobe field, which may be missing or "N/A", to a number or None."""
+    try:
+        return convert(value)
+    except (TypeError, ValueError):
+        return None
+
+def probe_audio(file_path: Path) -> Dict:
+    """Read codec, sample rate, bitrate and duration of a file's first audio stream."""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "a:0",
+         "-show_entries", "stream=codec_name,sample_rate,channels,bit_rate:format=duration,bit_rate",
+         "-of", "json", str(file_path)],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        return {}
+    
+    data = json.loads(result.stdout or "{}")
+    streams = data.get("streams") or [{}]
+    stream, fmt = streams[0], data.get("format", {})
+    
+    return {
+        "codec": stream.get("codec_name"),
+        "sample_rate": parse_number(stream.get("sample_rate"), int),
+        "channels": parse_number(stream.get("channels"), int),
+        # Some containers only report the overall bitrate
+        "bit_rate": parse_number(stream.get("bit_rate"), int) or parse_number(fmt.get("bit_rate"), int),
+        "duration": parse_number(fmt.get("duration"), float),
+    }
+
+def can_stream_copy(info: Optional[Dict], output_format: str, bitrate: str, sample_rate: str) -> bool:
+    """Check whether the source audio already matches what the encoder would produce."""
+    if not info or info.get("codec") != TARGET_CODECS.get(output_format):
+        return False
+    
+    if sample_rate and info.get("sample_rate") != int(sample_rate):
+        return False
+    
+    if bitrate:
+        # Allow a little slack; VBR sources only report an average
+        requested = int(bitrate[:-1]) * 1000
+        actual = info.get("bit_rate")
+        if not actual or abs(actual - requested) > requested * 0.05:
+            return False
+    
+    return True
+
+def iter_audio_entries(source_path: Path, recursive: bool = False,
+                       exclude: Optional[Path] = None) -> Iterator[os.DirEntry]:
+    """Yield os.scandir entries of the audio files in a folder, descending into subfolders if recursive."""
+    excluded = str(exclude) if exclude else None
+    pending = [str(source_path)]
+    
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                subfolders = []
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        # Never descend into the destination, or outputs would be converted again
+                        if recursive and entry.path != excluded:
+                            subfolders.append(entry.path)
+                    elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in AUDIO_EXTENSIONS:
+                        yield entry
+        except OSError as e:
+            log(f"Error reading folder '{current}': {e}")
+            continue
+        pending.extend(reversed(subfolders))
+
+def iter_audio_files(source_path: Path, recursive: bool = False,
+                     exclude: Optional[Path] = None) -> Iterator[Path]:
+    """Yield audio files in a folder as they are found, descending into subfolders if recursive."""
+    for entry in iter_audio_entries(source_path, recursive, exclude):
+        yield Path(entry.path)
+
+def get_audio_files(source_path: str, mode: str, recursive: bool = False,
+                    exclude: Optional[str] = None) -> Iterable[Path]:
+    """Get audio files based on mode and automatically detect formats.
     
+    In recursive folder mode the files are streamed as they are found, so
+    conversion can start before the whole tree has been scanned.
+    """
     audio_files = []
     source_path = Path(source_path).resolve()  # Normalize and resolve path
     
     if mode == "single":
         if source_path.is_file():
-            if source_path.suffix.lower() in audio_extensions:
+            if source_path.suffix.lower() in AUDIO_EXTENSIONS:
                 audio_files.append(source_path)
             else:
                 print(f"Warning: '{source_path.name}' may not be a supported audio file.")
@@ -38,9 +455,10 @@ def get_audio_files(source_path: str, mode: str) -> List[Path]:
         if not source_path.is_dir():
             print(f"Error: '{source_path}' is not a directory!")
             return []
-        for file_path in source_path.iterdir():
-            if file_path.is_file() and file_path.suffix.lower() in audio_extensions:
-                audio_files.append(file_path)
+        exclude_path = Path(exclude).resolve() if exclude else None
+        if recursive:
+            return iter_audio_files(source_path, recursive=True, exclude=exclude_path)
+        audio_files.extend(iter_audio_files(source_path, exclude=exclude_path))
     
     return audio_files
 
@@ -49,7 +467,53 @@ def validate_output_format(fmt: str) -> bool:
     supported_formats = {'.mp3', '.wav', '.flac', '.aac', '.ogg', '.m4a'}
     return fmt.lower() in supported_formats
 
-def get_user_input() -> Tuple[str, str, str, str, str, bool, int, int]:
+def get_target_settings(output_format: str) -> Dict[str, str]:
+    """Get quality, bitrate and sample rate for one output format."""
+    # Get quality setting
+    quality_map = {'1': '0', '2': '2', '3': '4', '4': '6', '5': '9'}
+    quality_param = "-q:a" if output_format in ('.mp3', '.aac', '.m4a') else "-compression_level"
+    
+    print("\nAudio quality options:")
+    print("1. Highest quality (0)")
+    print("2. High quality (2)")
+    print("3. Medium quality (4)")
+    print("4. Low quality (6)")
+    print("5. Lowest quality (9)")
+    print("6. Custom quality")
+    
+    while True:
+        choice = input("Choose quality (1-6): ").strip()
+        if choice in quality_map:
+            quality = quality_map[choice]
+            break
+        elif choice == "6":
+            while True:
+                custom_quality = input("Enter quality (0-9, 0=highest, 9=lowest): ").strip()
+                if custom_quality.isdigit() and 0 <= int(custom_quality) <= 9:
+                    quality = custom_quality
+                    break
+                print("Please enter a number between 0-9.")
+            break
+        print("Please enter a number between 1-6.")
+    
+    # Get bitrate (optional)
+    while True:
+        bitrate = input("Enter bitrate (e.g., 192k, leave blank for default): ").strip()
+        if not bitrate or bitrate.lower().endswith('k') and bitrate[:-1].isdigit():
+            break
+        print("Please enter a valid bitrate (e.g., 192k) or leave blank.")
+    
+    # Get sample rate (optional)
+    while True:
+        sample_rate = input("Enter sample rate (e.g., 44100, leave blank for default): ").strip()
+        if not sample_rate or sample_rate.isdigit():
+            break
+        print("Please enter a valid sample rate (e.g., 44100) or leave blank.")
+    
+    return {"format": output_format, "quality": quality, "bitrate": bitrate, "sample_rate": sample_rate}
+
+def get_user_input() -> Tuple[str, str, str, List[Dict[str, str]], bool, int, bool, bool, bool, bool,
+                             Optional[float], Optional[str]]:
     """Get user input for paths and conversion settings."""
     print("=== Audio File Converter ===\n")
     
@@ -83,6 +547,11 @@ def get_user_input() -> Tuple[str, str, str, str, str, bool, int, int]:
             continue
         break
     
+    # Ask about subfolders (folder mode only)
+    recursive = False
+    if mode == "folder":
+        recursive = ask_yes_no("Include subfolders (recreates the folder structure in the destination)?")
+    
     # Get destination path
     default_dest = os.path.dirname(source_path) if mode == "single" else source_path
     while True:
@@ -106,209 +575,1220 @@ def get_user_input() -> Tuple[str, str, str, str, str, bool, int, int]:
         print(f"{i}. {fmt.upper()}")
     print("7. Custom format")
     
+    # Several formats can be picked; each source is then decoded once for all of them
     while True:
-        choice = input("Choose output format (1-7): ").strip()
-        if choice.isdigit() and 1 <= int(choice) <= 6:
-            output_format = output_formats[int(choice) - 1]
+        choices = input("Choose output format(s) (1-7, comma-separated for several, e.g. 1,3): ").split(',')
+        choices = [c.strip() for c in choices]
+        if all(c.isdigit() and 1 <= int(c) <= 7 for c in choices):
             break
-        elif choice == "7":
-            custom_format = input("Enter custom format (e.g., mp4): ").strip()
-            if not custom_format.startswith('.'):
-                custom_format = '.' + custom_format
-            if validate_output_format(custom_format):
-                output_format = custom_format.lower()
+        print("Please enter numbers between 1-7, separated by commas.")
+    
+    selected_formats = []
+    for choice in choices:
+        if choice == "7":
+            while True:
+                custom_format = input("Enter custom format (e.g., mp4): ").strip()
+                if not custom_format.startswith('.'):
+                    custom_format = '.' + custom_format
+                if validate_output_format(custom_format):
+                    output_format = custom_format.lower()
+                    break
+                print(f"Error: '{custom_format}' is not a supported audio format.")
+        else:
+            output_format = output_formats[int(choice) - 1]
+        if output_format not in selected_formats:
+            selected_formats.append(output_format)
+    
+    # Get quality, bitrate and sample rate for each format
+    targets = []
+    for output_format in selected_formats:
+        if len(selected_formats) > 1:
+            print(f"\n--- Settings for {output_format.upper()} ---")
+        targets.append(get_target_settings(output_format))
+    
+    # Ask about overwriting existing files
+    overwrite = ask_yes_no("Overwrite existing files?")
+    
+    # Ask about incremental conversion against the destination manifest
+    incremental = ask_yes_no("Only convert new or changed files (incremental)?")
+    use_hash = False
+    if incremental:
+        use_hash = ask_yes_no("Compare file contents by hash (slower, catches changes that keep size and date)?")
+    
+    # Get number of parallel conversions (folder mode only)
+    workers = 1
+    if mode == "folder":
+        while True:
+            workers_input = input(f"Parallel conversions (default: {default_workers()}): ").strip()
+            if not workers_input:
+                workers = default_workers()
+                break
+            if workers_input.isdigit() and int(workers_input) >= 1:
+                workers = int(workers_input)
                 break
-            print(f"Error: '{custom_format}' is not a supported audio format.")
+            print("Please enter a positive number or leave blank.")
+    
+    # Ask about remuxing sources that are already in the target codec
+    stream_copy = ask_yes_no("Copy audio without re-encoding when the source already matches the target?")
+    
+    # Ask about loudness normalization
+    normalize = None
+    if ask_yes_no(f"Normalize loudness to {DEFAULT_LOUDNESS:g} LUFS (EBU R128)?"):
+        normalize = DEFAULT_LOUDNESS
+    
+    # Ask about converting byte-identical copies of a file only once (folder mode only)
+    dedupe = None
+    if mode == "folder" and ask_yes_no("Convert identical files only once and hardlink the other outputs?"):
+        dedupe = "link"
+    
+    return (source_path, dest_path, mode, targets, overwrite, workers,
+            incremental, use_hash, recursive, stream_copy, normalize, dedupe)
+
+def get_skip_reason(file_path: Path, output_path: Path, output_format: str,
+                    overwrite: bool, claimed_outputs: Set[Path]) -> Optional[str]:
+    """Return why a file should not be converted, or None if it should."""
+    # Skip if file exists and overwrite is disabled
+    if output_path.exists() and not overwrite:
+        return "already exists"
+    
+    # Skip if another file in this batch writes the same output (e.g. song.wav and song.flac)
+    if output_path in claimed_outputs:
+        return "duplicate output name"
+    
+    # Skip if input and output are the same
+    if file_path.suffix.lower() == output_format.lower() and file_path.parent == output_path.parent:
+        return "same format and location"
+    
+    # Check file size
+    if file_path.stat().st_size == 0:
+        return "empty file"
+    
+    return None
+
+def encoding_args(output_format: str, quality: str, bitrate: str, sample_rate: str) -> List[str]:
+    """Build the FFmpeg arguments that determine what the output sounds like."""
+    args = ["-map_metadata", "0"]
+    
+    # Add quality or compression level based on format
+    if output_format in ('.mp3', '.aac', '.m4a'):
+        args.extend(["-q:a", quality])
+    elif output_format == '.flac':
+        args.extend(["-compression_level", quality])
+    
+    # Add bitrate if specified
+    if bitrate:
+        args.extend(["-b:a", bitrate])
+    
+    # Add sample rate if specified
+    if sample_rate:
+        args.extend(["-ar", sample_rate])
+    
+    return args
+
+def build_ffmpeg_command(file_path: Path, outputs: List[Tuple[Path, List[str]]],
+                         overwrite: bool, threads: int) -> List[str]:
+    """Build one FFmpeg command that decodes a file once and writes every requested output."""
+    # -nostdin stops parallel FFmpeg processes from competing for the terminal, and
+    # -progress streams machine-readable status on stdout instead of the stats line
+    cmd = ["ffmpeg", "-nostdin", "-nostats", "-progress", "pipe:1", "-i", str(file_path)]
+    if overwrite:
+        cmd.append("-y")
+    
+    for output_path, encoding in outputs:
+        cmd.extend(encoding)
+        # Limit encoder threads to this job's share of the CPU
+        cmd.extend(["-threads", str(threads)])
+        cmd.append(str(output_path))
+    return cmd
+
+def run_ffmpeg(cmd: List[str], on_progress=None, tail_lines: int = 50,
+               stderr_tail: Optional[List[str]] = None) -> Tuple[bool, str]:
+    """Run an FFmpeg command and return (success, most relevant error line).
+    
+    Each block of -progress output is passed to on_progress as a dict while
+    FFmpeg runs. Only the last tail_lines lines of stderr are kept in memory;
+    pass a list as stderr_tail to get them.
+    """
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors='replace'
+    )
+    
+    # Drain stderr on its own thread so a chatty FFmpeg can't block on a full pipe
+    error_tail = deque(maxlen=tail_lines)
+    def drain_stderr():
+        for line in process.stderr:
+            error_tail.append(line.rstrip('\n'))
+    reader = threading.Thread(target=drain_stderr, daemon=True)
+    reader.start()
+    
+    stats = {}
+    for line in process.stdout:
+        key, _, value = line.strip().partition('=')
+        stats[key] = value
+        # Every progress block ends with progress=continue or progress=end
+        if key == "progress" and on_progress is not None:
+            on_progress(dict(stats))
+    
+    returncode = process.wait()
+    reader.join()
+    if stderr_tail is not None:
+        stderr_tail.extend(error_tail)
+    
+    if returncode == 0:
+        return True, ""
+    
+    relevant_errors = [line for line in error_tail if 'error' in line.lower() or 'invalid' in line.lower()]
+    return False, relevant_errors[-1] if relevant_errors else ""
+
+def loudnorm_filter(target: float, measured: Optional[Dict] = None) -> str:
+    """Build the loudnorm filter for the analysis pass, or for the encode pass given its measurement."""
+    options = [f"I={target:g}", f"TP={LOUDNORM_TRUE_PEAK:g}", f"LRA={LOUDNORM_RANGE:g}"]
+    if measured is None:
+        options.append("print_format=json")
+    else:
+        options.extend([
+            f"measured_I={measured['input_i']}",
+            f"measured_TP={measured['input_tp']}",
+            f"measured_LRA={measured['input_lra']}",
+            f"measured_thresh={measured['input_thresh']}",
+            f"offset={measured['target_offset']}",
+            "linear=true",
+        ])
+    return "loudnorm=" + ":".join(options)
+
+def measure_loudness(file_path: Path, target: float, threads: int, on_progress=None) -> Tuple[Optional[Dict], str]:
+    """Run loudnorm's analysis pass over a file; return (measurement, error)."""
+    cmd = ["ffmpeg", "-nostdin", "-nostats", "-hide_banner", "-progress", "pipe:1", "-i", str(file_path),
+           "-threads", str(threads), "-af", loudnorm_filter(target), "-f", "null", "-"]
+    stderr_tail = []
+    success, error = run_ffmpeg(cmd, on_progress, stderr_tail=stderr_tail)
+    if not success:
+        return None, error
+    
+    # loudnorm prints its measurement as a JSON object at the end of stderr
+    text = "\n".join(stderr_tail)
+    try:
+        measured = json.loads(text[text.rindex("{"):text.rindex("}") + 1])
+        float(measured["input_i"])
+    except (ValueError, KeyError):
+        return None, "Loudness analysis printed no measurement"
+    # Silence measures as -inf, which loudnorm can't be given back
+    if measured["input_i"] in ("-inf", "inf"):
+        return None, "Source is silent; it can't be loudness normalized"
+    return {key: measured[key] for key in ("input_i", "input_tp", "input_lra", "input_thresh", "target_offset")}, ""
+
+class MetricsLog:
+    """Thread-safe JSON-lines writer for per-conversion telemetry."""
+    
+    def __init__(self, path: str):
+        self.file = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+    
+    def write(self, record: Dict) -> None:
+        """Append one record, stamped with the current time."""
+        line = json.dumps({"time": round(time.time(), 3), **record}, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + '\n')
+    
+    def close(self) -> None:
+        """Flush and close the file."""
+        with self.lock:
+            self.file.close()
+
+def progress_metrics(stats: Dict[str, str], elapsed: float, size: int, duration: float) -> Dict:
+    """Turn one block of FFmpeg -progress output into throughput figures."""
+    # out_time_ms is really in microseconds; newer FFmpeg also reports out_time_us
+    out_us = parse_number(stats.get("out_time_us"), int) or parse_number(stats.get("out_time_ms"), int) or 0
+    audio_seconds = out_us / 1_000_000
+    fraction = min(1.0, audio_seconds / duration) if duration > 0 else 0.0
+    return {
+        "elapsed": round(elapsed, 3),
+        "audio_seconds": round(audio_seconds, 3),
+        "realtime_factor": round(audio_seconds / elapsed, 2) if elapsed > 0 else 0.0,
+        # FFmpeg doesn't report bytes read; estimate them from how far into the file it is
+        "bytes_in": size if stats.get("progress") == "end" else int(size * fraction),
+        "bytes_out": parse_number(stats.get("total_size"), int) or 0,
+    }
+
+def process_task(task: Dict, threads: int, metrics: Optional[MetricsLog] = None) -> Tuple[bool, str]:
+    """Convert one source file in a worker thread, remuxing instead of re-encoding when possible."""
+    group = task["group"]
+    task["started"] = task["last_progress"] = time.monotonic()
+    normalize = group["normalize"]
+    if (group["stream_copy"] or normalize is not None) and task["probe"] is None and check_ffprobe():
+        task["probe"] = probe_audio(task["source"])
+        task["probed"] = True
+    
+    loudness = None
+    if normalize is not None:
+        # Measurements are cached by content, so renamed or copied sources aren't measured again
+        if task["digest"] is None:
+            task["digest"] = file_hash(task["source"])
+            task["hashed"] = True
+        loudness = group["loudness"].get(task["digest"])
+        if loudness is None:
+            def on_analysis(stats):
+                task["last_progress"] = time.monotonic()
+            loudness, error = measure_loudness(task["source"], normalize, threads, on_analysis)
+            if loudness is None:
+                return False, error
+            task["measured"] = loudness
+    
+    outputs = []
+    for output in task["outputs"]:
+        target = output["target"]
+        # Deduplicated outputs may be hardlinks; FFmpeg would rewrite every copy in place
+        if task["replace"] and output["path"].exists() and output["path"].stat().st_nlink > 1:
+            output["path"].unlink()
+        output["copied"] = group["stream_copy"] and normalize is None and can_stream_copy(
+            task["probe"], target["format"], target["bitrate"], target["sample_rate"]
+        )
+        if output["copied"]:
+            encoding = STREAM_COPY_ARGS
+        elif loudness is not None:
+            encoding = target["encoding"] + ["-af", loudnorm_filter(normalize, loudness)]
+            if not target["sample_rate"]:
+                source_rate = (task["probe"] or {}).get("sample_rate")
+                encoding += ["-ar", str(source_rate or LOUDNORM_SAMPLE_RATE)]
         else:
-            print("Please enter a number between 1-7.")
+            encoding = target["encoding"]
+        outputs.append((output["path"], encoding))
     
-    # Get quality setting
-    quality_map = {'1': '0', '2': '2', '3': '4', '4': '6', '5': '9'}
-    quality_param = "-q:a" if output_format in ('.mp3', '.aac', '.m4a') else "-compression_level"
+    cmd = build_ffmpeg_command(task["source"], outputs, task["replace"], threads)
+    size, _, _ = task["state"]
+    duration = estimate_duration(task["source"], size, task["probe"])
+    started = time.monotonic()
     
-    print("\nAudio quality options:")
-    print("1. Highest quality (0)")
-    print("2. High quality (2)")
-    print("3. Medium quality (4)")
-    print("4. Low quality (6)")
-    print("5. Lowest quality (9)")
-    print("6. Custom quality")
+    def on_progress(stats):
+        # Read by the main thread for the live display and stall warnings
+        task["last_progress"] = time.monotonic()
+        task["metrics"] = progress_metrics(stats, task["last_progress"] - started, size, duration)
+        if metrics is not None:
+            metrics.write({"event": "progress", "source": str(task["source"]), **task["metrics"]})
     
-    while True:
-        choice = input("Choose quality (1-6): ").strip()
-        if choice in quality_map:
-            quality = quality_map[choice]
-            break
-        elif choice == "6":
-            while True:
-                custom_quality = input("Enter quality (0-9, 0=highest, 9=lowest): ").strip()
-                if custom_quality.isdigit() and 0 <= int(custom_quality) <= 9:
-                    quality = custom_quality
-                    break
-                print("Please enter a number between 0-9.")
-            break
-        print("Please enter a number between 1-6.")
+    success, error = run_ffmpeg(cmd, on_progress)
+    task["elapsed"] = time.monotonic() - started
+    if metrics is not None:
+        metrics.write({
+            "event": "end",
+            "source": str(task["source"]),
+            "outputs": [str(output["path"]) for output in task["outputs"]],
+            "status": "ok" if success else "error",
+            "error": error,
+            **task.get("metrics", {}),
+            "elapsed": round(task["elapsed"], 3),
+        })
+    return success, error
+
+def estimate_duration(file_path: Path, size: int, probe: Optional[Dict]) -> float:
+    """Audio duration in seconds, from ffprobe when known or else guessed from the file size."""
+    if probe and probe.get("duration"):
+        return probe["duration"]
+    return size / BYTES_PER_SECOND.get(file_path.suffix.lower(), 24000)
+
+def speed_key(outputs: List[Dict], copied: List[bool]) -> str:
+    """Identify a combination of outputs in the encode-speed history."""
+    return json.dumps(["copy" if was_copied else output["target"]["params"]
+                       for output, was_copied in zip(outputs, copied)])
+
+def estimate_cost(task: Dict, cache: AudioCache) -> float:
+    """Estimate how long a task will take, in wall-clock seconds, for longest-first scheduling."""
+    normalize = task["group"]["normalize"]
+    predicted = [
+        task["group"]["stream_copy"] and normalize is None and can_stream_copy(
+            task["probe"], output["target"]["format"], output["target"]["bitrate"], output["target"]["sample_rate"]
+        )
+        for output in task["outputs"]
+    ]
+    speed = cache.get_speed(speed_key(task["outputs"], predicted))
+    if speed is None:
+        speed = DEFAULT_COPY_SPEED if all(predicted) else DEFAULT_ENCODE_SPEED
+    size, _, _ = task["state"]
+    cost = estimate_duration(task["source"], size, task["probe"]) * speed
+    if normalize is not None and task["group"]["loudness"].get(task["digest"]) is None:
+        # The analysis pass decodes the whole file once more
+        cost += estimate_duration(task["source"], size, task["probe"]) * DEFAULT_ANALYSIS_SPEED
+    return cost
+
+def dispatch(executor, pending: List, in_flight: Dict, workers: int, threads: int,
+             metrics: Optional[MetricsLog], say) -> None:
+    """Start the most expensive queued tasks until every worker is busy."""
+    while pending and len(in_flight) < workers:
+        _, _, task = heapq.heappop(pending)
+        say(f"Converting: {task['name']} → {', '.join(output['path'].name for output in task['outputs'])}")
+        in_flight[executor.submit(process_task, task, threads, metrics)] = task
+
+def report_live(in_flight: Dict, progress, say) -> None:
+    """Show throughput of running conversions and warn about ones that stopped progressing."""
+    now = time.monotonic()
+    running = [task for task in in_flight.values() if "started" in task]
     
-    # Get bitrate (optional)
-    while True:
-        bitrate = input("Enter bitrate (e.g., 192k, leave blank for default): ").strip()
-        if not bitrate or bitrate.lower().endswith('k') and bitrate[:-1].isdigit():
-            break
-        print("Please enter a valid bitrate (e.g., 192k) or leave blank.")
+    for task in running:
+        if now - task["last_progress"] > STALL_SECONDS and not task.get("stall_warned"):
+            say(f"⚠️  No progress for {STALL_SECONDS}s: {task['name']}")
+            task["stall_warned"] = True
     
-    # Get sample rate (optional)
-    while True:
-        sample_rate = input("Enter sample rate (e.g., 44100, leave blank for default): ").strip()
-        if not sample_rate or sample_rate.isdigit():
-            break
-        print("Please enter a valid sample rate (e.g., 44100) or leave blank.")
+    if progress is not None:
+        live = [task["metrics"] for task in running if "metrics" in task]
+        audio_seconds = sum(item["audio_seconds"] for item in live)
+        elapsed = max((item["elapsed"] for item in live), default=0)
+        progress.set_postfix(
+            active=len(running),
+            speed=f"{audio_seconds / elapsed:.1f}x" if elapsed else "-",
+            out=f"{sum(item['bytes_out'] for item in live) / 1_000_000:.1f}MB",
+            refresh=False
+        )
+        progress.refresh()
+
+def ensure_dir(folder: Path, created_dirs: Set[Path]) -> None:
+    """Create an output folder once per run instead of once per file."""
+    if folder not in created_dirs:
+        folder.mkdir(parents=True, exist_ok=True)
+        created_dirs.add(folder)
+
+def add_result(results: List[Dict], group: Dict, source: Path, name: str, status: str,
+               output: Optional[Path] = None, message: str = "") -> None:
+    """Append one structured per-file result."""
+    results.append({
+        "job": group["index"],
+        "source": str(source),
+        "output": str(output) if output else None,
+        "name": name,
+        "status": status,
+        "message": message,
+    })
+
+def output_path_for(file_path: Path, group: Dict, target: Dict) -> Path:
+    """Where a source's output for a target goes, mirroring the source's subfolders."""
+    return group["dest"] / file_path.parent.relative_to(group["root"]) / (file_path.stem + target["format"])
+
+def link_or_copy(source: Path, target: Path, method: str) -> str:
+    """Materialize target from source as a hardlink, or a copy if linking isn't wanted or possible."""
+    if target.exists() or target.is_symlink():
+        target.unlink()
+    if method == "link":
+        try:
+            os.link(source, target)
+            return "hardlinked"
+        except OSError:
+            # Different file systems, or one without hardlinks
+            pass
+    shutil.copy2(source, target)
+    return "copied"
+
+def deduplicate(task: Dict, primary: Dict, results: List[Dict], say) -> Optional[Dict]:
+    """Reuse a converted identical source's outputs; return a task for any that still need FFmpeg."""
+    group = task["group"]
+    remaining = []
+    for output in task["outputs"]:
+        target = output["target"]
+        primary_output = output_path_for(primary["source"], group, target)
+        if not group["manifest"].is_up_to_date(primary_output, primary["source"], primary["state"], target["params"]):
+            remaining.append(output)
+            continue
+        try:
+            method = link_or_copy(primary_output, output["path"], group["dedupe"])
+        except OSError as e:
+            say(f"❌ Error converting {output['label']}")
+            add_result(results, group, task["source"], output["label"], "error", output["path"], str(e))
+            continue
+        say(f"✅ Deduplicated ({method} from {primary['name']}): {output['label']}")
+        add_result(results, group, task["source"], output["label"], "deduplicated", output["path"],
+                   f"{method} from {primary_output}")
+        group["manifest"].record(output["path"], task["source"], task["state"], target["params"])
     
-    # Ask about overwriting existing files
-    while True:
-        overwrite = input("Overwrite existing files? (y/n): ").strip().lower()
-        if overwrite in ('y', 'yes', 'n', 'no'):
-            overwrite = overwrite in ('y', 'yes')
-            break
-        print("Please enter 'y' or 'n'.")
+    if not remaining:
+        return None
+    task["outputs"] = remaining
+    task["replace"] = any(output["replace"] for output in remaining)
+    return task
+
+def resolve_duplicate(task: Dict, group: Dict, results: List[Dict], say) -> Optional[Dict]:
+    """Check a prepared task against the job's content index.
     
-    return source_path, dest_path, mode, output_format, quality, overwrite, bitrate, sample_rate
+    Returns the task if it must be converted, None if its outputs were reused,
+    or the task with "primary" set if it waits for an identical file in flight.
+    """
+    index = group["content_index"]
+    primary = index.find(task)
+    if primary is None:
+        index.add(task)
+        return task
+    if "outputs" in primary and not primary.get("done"):
+        task["primary"] = primary
+        primary.setdefault("duplicates", []).append(task)
+        return task
+    return deduplicate(task, primary, results, say)
 
-def convert_audio_files():
-    """Main function to convert audio files based on user input."""
+def record_result(future, task: Dict, cache: AudioCache, results: List[Dict], progress, say) -> List[Dict]:
+    """Update the results, manifest and cache for a finished conversion.
+    
+    Returns the identical files that waited on this one but still need their
+    own conversion.
+    """
+    group = task["group"]
+    try:
+        success, error = future.result()
+    except Exception as e:
+        success, error = False, str(e)
+    
+    # Probes are stored from the main thread since SQLite connections can't be shared
+    size, mtime_ns, _ = task["state"]
+    if task.get("probed") and task["probe"]:
+        cache.store_probe(task["source"], size, mtime_ns, task["probe"])
+    if task.get("hashed"):
+        hashes = cache.get_hashes(task["source"], size, mtime_ns)
+        hashes["full"] = task["digest"]
+        cache.store_hashes(task["source"], size, mtime_ns, hashes)
+    if task.get("measured"):
+        group["loudness"][task["digest"]] = task["measured"]
+        cache.store_loudness(task["digest"], group["normalize"], task["measured"])
+    
+    if success:
+        # Remember how fast these settings ran to schedule future runs better
+        size, _, _ = task["state"]
+        duration = estimate_duration(task["source"], size, task["probe"])
+        if duration > 0 and "elapsed" in task:
+            copied = [bool(output.get("copied")) for output in task["outputs"]]
+            cache.record_speed(speed_key(task["outputs"], copied), task["elapsed"] / duration)
+        
+        for output in task["outputs"]:
+            if output.get("copied"):
+                say(f"✅ Successfully copied (no re-encode): {output['label']}")
+            else:
+                say(f"✅ Successfully converted: {output['label']}")
+            add_result(results, group, task["source"], output["label"],
+                       "copied" if output.get("copied") else "converted", output["path"])
+            group["manifest"].record(output["path"], task["source"], task["state"], output["target"]["params"])
+    else:
+        # A failed FFmpeg run produces none of its outputs
+        for output in task["outputs"]:
+            say(f"❌ Error converting {output['label']}")
+            add_result(results, group, task["source"], output["label"], "error", output["path"], error)
+        if error:
+            say(f"   Error: {error}")
+    
+    if progress is not None:
+        progress.update(1)
+    
+    task["done"] = True
+    requeue = []
+    for duplicate in task.pop("duplicates", []):
+        duplicate.pop("primary")
+        if success:
+            leftover = deduplicate(duplicate, task, results, say)
+            if leftover is not None:
+                requeue.append(leftover)
+                continue
+        else:
+            for output in duplicate["outputs"]:
+                say(f"❌ Error converting {output['label']}")
+                add_result(results, group, duplicate["source"], output["label"], "error", output["path"],
+                           f"same content as {task['name']}, which failed to convert")
+        if progress is not None:
+            progress.update(1)
+    return requeue
+
+def prepare_task(file_path: Path, group: Dict, claimed_outputs: Set[Path], created_dirs: Set[Path],
+                 cache: AudioCache, results: List[Dict], say) -> Optional[Dict]:
+    """Decide which outputs a source still needs; return its task, or None if all were skipped."""
+    manifest = group["manifest"]
+    name = str(file_path.relative_to(group["root"]))
+    state = manifest.source_state(file_path, group["use_hash"])
+    
+    outputs = []
+    for target in group["targets"]:
+        output_path = output_path_for(file_path, group, target)
+        label = name if len(group["targets"]) == 1 else f"{name} → {output_path.name}"
+        
+        # Skip outputs already made from this exact source with these settings
+        if group["incremental"] and manifest.is_up_to_date(output_path, file_path, state, target["params"]):
+            skip_reason = "up to date"
+            claimed_outputs.add(output_path)
+        else:
+            # Outputs from an earlier run are ours to replace once their source or settings change
+            replace = group["overwrite"] or (group["incremental"] and manifest.has_entry(output_path))
+            skip_reason = get_skip_reason(file_path, output_path, target["format"], replace, claimed_outputs)
+        if skip_reason:
+            say(f"Skipped ({skip_reason}): {label}")
+            add_result(results, group, file_path, label, "skipped", output_path, skip_reason)
+            continue
+        
+        claimed_outputs.add(output_path)
+        outputs.append({"target": target, "path": output_path, "label": label, "replace": replace})
+    
+    if not outputs:
+        # Its up-to-date outputs can still be reused for identical files later in the job
+        if group.get("content_index") is not None:
+            group["content_index"].add({"source": file_path, "state": state, "name": name})
+        return None
+    
+    ensure_dir(outputs[0]["path"].parent, created_dirs)
+    size, mtime_ns, digest = state
+    if digest is None and group["normalize"] is not None:
+        digest = cache.get_hashes(file_path, size, mtime_ns)["full"]
+    return {
+        "group": group,
+        "source": file_path,
+        "outputs": outputs,
+        "state": state,
+        "name": name,
+        "replace": any(output["replace"] for output in outputs),
+        # Cache hits skip ffprobe; misses are probed by the worker if needed
+        "probe": cache.get_probe(file_path, size, mtime_ns),
+        # Content hash, if known, to find cached loudness measurements; workers hash the rest
+        "digest": digest,
+    }
+
+# Settings that can be given for a whole run and overridden per job
+DEFAULT_OPTIONS = {
+    "workers": None,  # parallel FFmpeg processes; None means one per CPU core
+    "overwrite": False,
+    "incremental": False,
+    "use_hash": False,
+    "stream_copy": False,
+    "dedupe": None,  # "link" or "copy" to convert byte-identical sources only once
+    "normalize": None,  # target loudness in LUFS for EBU R128 normalization, or True for the default
+    "quiet": False,
+    "metrics_file": None,  # JSON-lines file for per-conversion telemetry
+}
+
+# Options that only make sense for a whole run
+RUN_OPTIONS = {"workers", "quiet", "metrics_file"}
+
+def normalize_target(target) -> Dict[str, str]:
+    """Validate one output format of a job spec and fill in its defaults."""
+    if isinstance(target, str):
+        target = {"format": target}
+    
+    output_format = str(target.get("format", "")).lower()
+    if not output_format.startswith('.'):
+        output_format = '.' + output_format
+    if not validate_output_format(output_format):
+        raise ValueError(f"'{output_format}' is not a supported audio format")
+    
+    quality = str(target.get("quality", "2"))
+    if not (quality.isdigit() and 0 <= int(quality) <= 9):
+        raise ValueError(f"Quality must be between 0-9, got '{quality}'")
+    
+    bitrate = str(target.get("bitrate") or "")
+    if bitrate and not (bitrate.lower().endswith('k') and bitrate[:-1].isdigit()):
+        raise ValueError(f"Bitrate must look like 192k, got '{bitrate}'")
+    
+    sample_rate = str(target.get("sample_rate") or "")
+    if sample_rate and not sample_rate.isdigit():
+        raise ValueError(f"Sample rate must be a number like 44100, got '{sample_rate}'")
+    
+    return {"format": output_format, "quality": quality, "bitrate": bitrate, "sample_rate": sample_rate}
+
+def prepare_job(index: int, job: Dict, options: Dict) -> Dict:
+    """Validate a job spec and resolve its paths, mode, targets and settings."""
+    if not job.get("source"):
+        raise ValueError("Job has no 'source'")
+    source = Path(job["source"]).resolve()
+    if not source.exists():
+        raise ValueError(f"Path '{source}' does not exist!")
+    
+    mode = job.get("mode") or ("single" if source.is_file() else "folder")
+    if mode == "single" and not source.is_file():
+        raise ValueError(f"'{source}' is not a file!")
+    if mode == "folder" and not source.is_dir():
+        raise ValueError(f"'{source}' is not a directory!")
+    
+    dest = Path(job.get("dest") or (source.parent if mode == "single" else source)).resolve()
+    dest.mkdir(parents=True, exist_ok=True)
+    
+    targets = job.get("targets") or job.get("formats") or [job.get("format", "")]
+    if not isinstance(targets, list):
+        targets = [targets]
+    targets = [normalize_target(target) for target in targets]
+    
+    # An explicit list of files inside a folder job converts just those, e.g. new arrivals in watch mode
+    files = job.get("files")
+    if files is not None:
+        if mode != "folder":
+            raise ValueError("'files' can only be given for folder jobs")
+        files = [(source / file_path).resolve() for file_path in files]
+        outside = [str(file_path) for file_path in files if source not in file_path.parents]
+        if outside:
+            raise ValueError(f"Files outside '{source}': {', '.join(outside)}")
+    
+    group = {name: job.get(name, value) for name, value in options.items() if name not in RUN_OPTIONS}
+    if group["dedupe"] is True:
+        group["dedupe"] = "link"
+    if group["dedupe"] not in (None, False, "link", "copy"):
+        raise ValueError(f"dedupe must be 'link' or 'copy', got '{group['dedupe']}'")
+    if group["normalize"] is True:
+        group["normalize"] = DEFAULT_LOUDNESS
+    elif group["normalize"] is False:
+        group["normalize"] = None
+    if group["normalize"] is not None:
+        try:
+            group["normalize"] = float(group["normalize"])
+        except (TypeError, ValueError):
+            raise ValueError(f"normalize must be a loudness in LUFS like -16, got '{group['normalize']}'")
+        if not -70 <= group["normalize"] <= -5:
+            raise ValueError(f"normalize must be between -70 and -5 LUFS, got {group['normalize']:g}")
+    group.update({
+        "index": index,
+        "source": source,
+        "dest": dest,
+        "mode": mode,
+        # A given list of files is never streamed, so it's counted like a flat folder
+        "recursive": mode == "folder" and files is None and bool(job.get("recursive")),
+        "files": files,
+        "root": source if mode == "folder" else source.parent,
+        "targets": targets,
+    })
+    return group
+
+def convert(jobs: List[Dict], options: Optional[Dict] = None) -> List[Dict]:
+    """Run conversion jobs in one process and return a result for every output file.
+    
+    Each job is a dict with "source", and optionally "dest", "mode" ("single"
+    or "folder", detected from the source if omitted), "recursive",
+    "targets": a list of format names or {"format", "quality", "bitrate",
+    "sample_rate"} dicts, and "files": paths inside a folder source to
+    convert instead of scanning it. Keys of DEFAULT_OPTIONS that aren't in RUN_OPTIONS
+    may also be set per job. All jobs share one worker pool, so files from every job
+    are scheduled longest first together.
+    
+    Each result has "job" (index into jobs), "source", "output", "name",
+    "status" ("converted", "copied", "deduplicated", "skipped" or "error")
+    and "message".
+    Raises RuntimeError if FFmpeg isn't available.
+    """
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    say = (lambda message: None) if options["quiet"] else log
+    
     if not check_ffmpeg():
-        print("❌ FFmpeg is not installed or not available in PATH!")
-        print("Please install FFmpeg from https://ffmpeg.org/download.html")
-        return
+        raise RuntimeError("FFmpeg is not installed or not available in PATH!")
     
-    print("✅ FFmpeg found!")
+    results = []
+    groups = []
+    for index, job in enumerate(jobs):
+        try:
+            groups.append(prepare_job(index, job, options))
+        except (OSError, ValueError) as e:
+            say(f"❌ Job {index + 1}: {e}")
+            results.append({"job": index, "source": str(job.get("source")), "output": None,
+                            "name": str(job.get("source")), "status": "error", "message": str(e)})
     
-    # Get user input
-    source_path, dest_path, mode, output_format, quality, overwrite, bitrate, sample_rate = get_user_input()
+    if any(group["stream_copy"] for group in groups) and not check_ffprobe():
+        say("⚠️  ffprobe not found; every file will be re-encoded.")
+        for group in groups:
+            group["stream_copy"] = False
     
-    print(f"\nSource: {source_path}")
-    print(f"Destination: {dest_path}")
-    print(f"Mode: {'Single file' if mode == 'single' else 'Folder'}")
-    print(f"Output format: {output_format.upper()}")
-    print(f"Quality: {quality} (0=highest, 9=lowest)")
-    print(f"Bitrate: {bitrate or 'Default'}")
-    print(f"Sample rate: {sample_rate or 'Default'}")
-    print(f"Overwrite existing: {'Yes' if overwrite else 'No'}")
+    cache = AudioCache()
+    metrics = MetricsLog(options["metrics_file"]) if options["metrics_file"] else None
+    manifests = {}  # one per destination, shared by jobs writing to the same folder
+    loudness_tables = {}  # cached loudnorm measurements per target loudness
+    for group in groups:
+        if group["dest"] not in manifests:
+            manifests[group["dest"]] = ConversionManifest(group["dest"])
+        group["manifest"] = manifests[group["dest"]]
+        group["content_index"] = ContentIndex(cache) if group["dedupe"] else None
+        for target in group["targets"]:
+            target["encoding"] = encoding_args(target["format"], target["quality"],
+                                               target["bitrate"], target["sample_rate"])
+            # Whether remuxing was allowed changes the output, so it's part of the manifest key
+            params = {"encoding": target["encoding"], "stream_copy": group["stream_copy"]}
+            if group["normalize"] is not None:
+                params["normalize"] = group["normalize"]
+            target["params"] = json.dumps(params)
+        
+        # Loaded up front so workers can look measurements up without touching SQLite
+        if group["normalize"] is not None:
+            if group["normalize"] not in loudness_tables:
+                loudness_tables[group["normalize"]] = cache.get_loudness(group["normalize"])
+            group["loudness"] = loudness_tables[group["normalize"]]
+        
+        # Subfolder scans are streamed; flat folders are listed up front so they can be counted
+        if group["files"] is None:
+            group["files"] = get_audio_files(str(group["source"]), group["mode"], group["recursive"],
+                                             exclude=str(group["dest"]))
+        if group["recursive"]:
+            say(f"\nScanning subfolders of {group['source']}; conversion starts as files are found.")
+        elif group["mode"] == "folder":
+            say(f"\nFound {len(group['files'])} audio files to convert in {group['source']}")
+            formats_found = set(file_path.suffix.lower() for file_path in group["files"])
+            if formats_found:
+                say(f"Input formats detected: {', '.join(fmt.upper() for fmt in sorted(formats_found))}")
+    
+    workers = max(1, options["workers"] or default_workers())
+    if all(group["mode"] == "single" for group in groups):
+        workers = 1
+    threads = threads_per_worker(workers)
+    say(f"Parallel jobs: {workers} ({threads} FFmpeg thread(s) each), longest files first")
+    
+    # Use tqdm for progress bar if available and converting folders
+    streaming = any(group["recursive"] for group in groups)
+    total_files = None if streaming else sum(len(group["files"]) for group in groups)
+    show_progress = HAS_TQDM and not options["quiet"] and any(group["mode"] == "folder" for group in groups)
+    progress = tqdm(total=total_files, desc="Converting", unit="file") if show_progress else None
+    
+    created_dirs = set()
+    claimed_outputs = set()
+    pending = []  # heap of (-estimated cost, discovery order, task)
+    in_flight = {}
+    discovered = 0
     
-    # Get all audio files
     try:
-        audio_files = get_audio_files(source_path, mode)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for group in groups:
+                for file_path in group["files"]:
+                    discovered += 1
+                    
+                    # Pick up finished conversions without blocking the scan
+                    for future in [future for future in in_flight if future.done()]:
+                        for leftover in record_result(future, in_flight.pop(future), cache, results, progress, say):
+                            discovered += 1
+                            heapq.heappush(pending, (-estimate_cost(leftover, cache), discovered, leftover))
+                    
+                    try:
+                        task = prepare_task(file_path, group, claimed_outputs, created_dirs, cache, results, say)
+                        if task is not None and group["content_index"] is not None:
+                            task = resolve_duplicate(task, group, results, say)
+                    except Exception as e:
+                        name = str(file_path.relative_to(group["root"]))
+                        say(f"❌ Error processing {name}: {e}")
+                        add_result(results, group, file_path, name, "error", message=str(e))
+                        task = None
+                    
+                    if task is None:
+                        if progress is not None:
+                            progress.update(1)
+                        continue
+                    if "primary" in task:
+                        # Finished together with the identical file it's waiting on
+                        continue
+                    heapq.heappush(pending, (-estimate_cost(task, cache), discovered, task))
+                    
+                    # When scanning subfolders, start work right away from the longest files seen so far
+                    if group["recursive"]:
+                        dispatch(executor, pending, in_flight, workers, threads, metrics, say)
+            
+            # Run everything still queued, longest first
+            while pending or in_flight:
+                dispatch(executor, pending, in_flight, workers, threads, metrics, say)
+                # Wake up regularly to refresh the live figures even while nothing finishes
+                done, _ = wait(in_flight, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for leftover in record_result(future, in_flight.pop(future), cache, results, progress, say):
+                        discovered += 1
+                        heapq.heappush(pending, (-estimate_cost(leftover, cache), discovered, leftover))
+                report_live(in_flight, progress, say)
+    finally:
+        # Keep finished work in the manifests even if the run is interrupted
+        if progress is not None:
+            progress.close()
+        for manifest in manifests.values():
+            manifest.close()
+        cache.close()
+        if metrics is not None:
+            metrics.close()
+    
+    # Completion order depends on timing; sort so the results are reproducible
+    results.sort(key=lambda result: (result["job"], result["source"], result["output"] or ""))
+    return results
+
+def snapshot_audio_files(folder: Path, recursive: bool, exclude: Path) -> Dict[Path, Tuple[int, int]]:
+    """Map every audio file in a folder to its size and modification time."""
+    snapshot = {}
+    for entry in iter_audio_entries(folder, recursive, exclude):
+        try:
+            stat = entry.stat()
+        except OSError:
+            # Deleted since the folder was listed
+            continue
+        snapshot[Path(entry.path)] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+class SourceWatcher:
+    """Reports audio files that appear or change in the jobs' source folders.
+    
+    Uses filesystem events from watchdog when it's installed, and otherwise
+    compares os.scandir snapshots every poll_interval seconds. Either way a
+    file is only reported once its size and modification time have stayed
+    the same for settle seconds, so files still being copied in are left
+    alone, and nothing runs between changes except the polling scan.
+    
+    Outputs never count as new sources: a destination inside the source
+    folder is skipped, and when outputs are written next to their sources
+    (the default), files passed to ignore() or recorded as outputs in the
+    job's manifest are skipped.
+    """
+    
+    def __init__(self, groups: List[Dict], settle: float = 2.0, poll_interval: float = 5.0):
+        self.groups = groups
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.pending = {}  # path -> [group index, (size, mtime_ns), time it last changed]
+        self.events = queue.Queue()
+        self.observer = None
+        self.written = set()
+        # Outputs only land among the sources when the destination is the source folder or above it
+        self.manifests = {index: ConversionManifest(str(group["dest"])) for index, group in enumerate(groups)
+                          if group["dest"] == group["source"] or group["dest"] in group["source"].parents}
         
-        if mode == "single":
-            print(f"\nFile to convert: {Path(source_path).name}")
-            input_format = Path(source_path).suffix.lower()
-            print(f"Detected input format: {input_format.upper()}")
+        if HAS_WATCHDOG:
+            self.observer = Observer()
+            for index, group in enumerate(groups):
+                self.observer.schedule(self._handler(index), str(group["source"]), recursive=group["recursive"])
+            self.observer.start()
         else:
-            print(f"\nFound {len(audio_files)} audio files to convert:")
-            formats_found = set(file_path.suffix.lower() for file_path in audio_files)
-            print(f"Input formats detected: {', '.join(fmt.upper() for fmt in sorted(formats_found))}")
+            self.known = [snapshot_audio_files(group["source"], group["recursive"], self._excluded(group))
+                          for group in groups]
+            self.next_poll = time.monotonic() + poll_interval
+    
+    def _handler(self, index: int):
+        """Build a watchdog handler that queues the paths of one job's events."""
+        events = self.events
         
-        if not audio_files:
-            print("No audio files found to process!" if mode == "folder" else
-                  "The selected file could not be processed!")
-            return
-    except Exception as e:
-        print(f"Error accessing source path: {e}")
-        return
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.event_type in ("created", "modified", "moved", "closed"):
+                    path = getattr(event, "dest_path", "") or event.src_path
+                    events.put((index, Path(path), event.is_directory))
+        
+        return Handler()
     
-    # Convert files
-    total_converted = 0
-    total_skipped = 0
-    total_errors = 0
+    @staticmethod
+    def _excluded(group: Dict) -> Optional[Path]:
+        """The destination, if it's a folder inside the source whose files are all outputs."""
+        return group["dest"] if group["dest"] != group["source"] else None
     
-    print(f"\n--- Starting conversion ---")
+    def _is_output(self, index: int, file_path: Path) -> bool:
+        """Check whether a file was written by a conversion rather than dropped in as a source."""
+        if file_path in self.written:
+            return True
+        manifest = self.manifests.get(index)
+        return manifest is not None and manifest.has_entry(file_path)
     
-    # Use tqdm for progress bar if available and in folder mode
-    file_iter = tqdm(audio_files, desc="Converting", unit="file") if HAS_TQDM and mode == "folder" else audio_files
+    def ignore(self, paths: Iterable[Path]) -> None:
+        """Remember files a conversion just wrote, so they aren't converted again as new sources."""
+        self.written.update(paths)
     
-    for file_path in file_iter:
+    def _track(self, index: int, file_path: Path, now: float) -> None:
+        """Start or restart the settle timer of a file that was reported as changed."""
+        group = self.groups[index]
+        excluded = self._excluded(group)
+        if (file_path.suffix.lower() not in AUDIO_EXTENSIONS
+                or (excluded is not None and excluded in file_path.parents)
+                or self._is_output(index, file_path)):
+            return
         try:
-            # Create output file path
-            output_filename = file_path.stem + output_format
-            output_path = Path(dest_path) / output_filename
-            
-            # Skip if file exists and overwrite is disabled
-            if output_path.exists() and not overwrite:
-                print(f"Skipped (already exists): {file_path.name}")
-                total_skipped += 1
+            stat = file_path.stat()
+        except OSError:
+            self.pending.pop(file_path, None)
+            return
+        self.pending[file_path] = [index, (stat.st_size, stat.st_mtime_ns), now]
+    
+    def _poll(self, now: float) -> None:
+        """Diff a new snapshot of each folder against the last one."""
+        for index, group in enumerate(self.groups):
+            snapshot = snapshot_audio_files(group["source"], group["recursive"], self._excluded(group))
+            for file_path, state in snapshot.items():
+                if self.known[index].get(file_path) != state and not self._is_output(index, file_path):
+                    self.pending[file_path] = [index, state, now]
+            self.known[index] = snapshot
+        self.next_poll = now + self.poll_interval
+    
+    def _settled(self, now: float) -> Dict[int, List[Path]]:
+        """Collect files that haven't changed for the settle time."""
+        ready = {}
+        for file_path, (index, state, changed) in list(self.pending.items()):
+            if now - changed < self.settle:
                 continue
-            
-            # Skip if input and output are the same
-            if file_path.suffix.lower() == output_format.lower() and str(file_path.parent) == dest_path:
-                print(f"Skipped (same format and location): {file_path.name}")
-                total_skipped += 1
+            try:
+                stat = file_path.stat()
+            except OSError:
+                del self.pending[file_path]
                 continue
-            
-            # Check file size
-            if file_path.stat().st_size == 0:
-                print(f"Skipped (empty file): {file_path.name}")
-                total_skipped += 1
+            if (stat.st_size, stat.st_mtime_ns) != state:
+                # Still being written
+                self.pending[file_path] = [index, (stat.st_size, stat.st_mtime_ns), now]
                 continue
+            del self.pending[file_path]
+            ready.setdefault(index, []).append(file_path)
+        return ready
+    
+    def wait(self) -> Dict[int, List[Path]]:
+        """Block until some files are ready; return them per job index."""
+        while True:
+            now = time.monotonic()
+            deadlines = [changed + self.settle for _, _, changed in self.pending.values()]
+            if self.observer is None:
+                deadlines.append(self.next_poll)
+            # With events and nothing pending, sleep until the next event
+            timeout = max(0.0, min(deadlines) - now) if deadlines else None
             
-            print(f"Converting: {file_path.name} → {output_filename}")
-            
-            # Build FFmpeg command
-            cmd = ["ffmpeg", "-i", str(file_path), "-map_metadata", "0"]
-            if overwrite:
-                cmd.append("-y")
-            
-            # Add quality or compression level based on format
-            if output_format in ('.mp3', '.aac', '.m4a'):
-                cmd.extend(["-q:a", quality])
-            elif output_format == '.flac':
-                cmd.extend(["-compression_level", quality])
-            
-            # Add bitrate if specified
-            if bitrate:
-                cmd.extend(["-b:a", bitrate])
-            
-            # Add sample rate if specified
-            if sample_rate:
-                cmd.extend(["-ar", sample_rate])
-            
-            cmd.append(str(output_path))
-            
-            # Execute FFmpeg command
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True
-            )
-            
-            if result.returncode == 0:
-                print(f"✅ Successfully converted: {file_path.name}")
-                total_converted += 1
+            try:
+                index, file_path, is_directory = self.events.get(timeout=timeout)
+            except queue.Empty:
+                pass
             else:
-                print(f"❌ Error converting {file_path.name}")
-                error_lines = result.stderr.strip().split('\n')
-                relevant_errors = [line for line in error_lines if 'error' in line.lower() or 'invalid' in line.lower()]
-                if relevant_errors:
-                    print(f"   Error: {relevant_errors[-1]}")
-                total_errors += 1
-                
-        except Exception as e:
-            print(f"❌ Error processing {file_path.name}: {e}")
-            total_errors += 1
-    
-    # Print summary
+                now = time.monotonic()
+                if is_directory:
+                    # A folder moved in at once only reports the folder itself
+                    group = self.groups[index]
+                    if group["recursive"] and self._excluded(group) != file_path:
+                        for entry in iter_audio_entries(file_path, True, self._excluded(group)):
+                            self._track(index, Path(entry.path), now)
+                else:
+                    self._track(index, file_path, now)
+            
+            now = time.monotonic()
+            if self.observer is None and now >= self.next_poll:
+                self._poll(now)
+            ready = self._settled(now)
+            if ready:
+                return ready
+    
+    def close(self) -> None:
+        """Stop receiving filesystem events."""
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+        for manifest in self.manifests.values():
+            manifest.close()
+
+def watch(jobs: List[Dict], options: Optional[Dict] = None, settle: float = 2.0,
+          poll_interval: float = 5.0, catch_up: bool = True) -> List[Dict]:
+    """Convert the jobs, then keep converting new and changed files in their folders until interrupted.
+    
+    Runs are always incremental, so a changed source replaces the outputs it
+    made before. Pass catch_up=False if the jobs were just converted. Single-file
+    jobs are not watched. Returns the results of every run once Ctrl+C is pressed.
+    """
+    options = {**DEFAULT_OPTIONS, **(options or {}), "incremental": True}
+    say = (lambda message: None) if options["quiet"] else log
+    results = convert(jobs, options) if catch_up else []
+    
+    watched = []
+    groups = []
+    for index, job in enumerate(jobs):
+        try:
+            group = prepare_job(index, job, options)
+        except (OSError, ValueError):
+            # Already reported by the first run
+            continue
+        if group["mode"] == "folder":
+            watched.append(index)
+            groups.append(group)
+    if not groups:
+        say("Nothing to watch: no folder jobs.")
+        return results
+    
+    watcher = SourceWatcher(groups, settle, poll_interval)
+    say(f"\n👀 Watching {len(groups)} folder(s) for new audio files "
+        f"({'filesystem events' if HAS_WATCHDOG else f'checking every {poll_interval:g}s'}). Press Ctrl+C to stop.")
+    try:
+        while True:
+            ready = watcher.wait()
+            batch = []
+            for position, files in sorted(ready.items()):
+                index = watched[position]
+                batch.append({**jobs[index], "files": [str(file_path) for file_path in files]})
+            say(f"\n{sum(len(files) for files in ready.values())} new or changed file(s)")
+            batch_results = convert(batch, options)
+            # Outputs written next to their sources must not come back as new files
+            watcher.ignore(Path(result["output"]) for result in batch_results if result["output"])
+            for result in batch_results:
+                # Report results against the caller's job list, not this batch
+                result["job"] = watched[sorted(ready)[result["job"]]]
+                results.append(result)
+    except KeyboardInterrupt:
+        say("\nStopped watching.")
+    finally:
+        watcher.close()
+    return results
+
+def print_summary(results: List[Dict]) -> None:
+    """Print counts and failures for a finished run (counts are per output file)."""
+    statuses = [result["status"] for result in results]
+    failed_files = sorted(result["name"] for result in results if result["status"] == "error")
+    
     print(f"\n=== Conversion Summary ===")
-    print(f"Files converted: {total_converted}")
-    print(f"Files skipped: {total_skipped}")
-    print(f"Errors encountered: {total_errors}")
-    print(f"Total files processed: {len(audio_files)}")
-    print("✅ Conversion completed successfully!" if total_errors == 0 else
+    print(f"Files converted: {statuses.count('converted') + statuses.count('copied') + statuses.count('deduplicated')}")
+    if statuses.count('copied'):
+        print(f"  of which copied without re-encoding: {statuses.count('copied')}")
+    if statuses.count('deduplicated'):
+        print(f"  of which reused from identical files: {statuses.count('deduplicated')}")
+    print(f"Files skipped: {statuses.count('skipped')}")
+    print(f"Errors encountered: {len(failed_files)}")
+    print(f"Total files processed: {len(set(result['source'] for result in results))}")
+    if failed_files:
+        print("Files with errors:")
+        for name in failed_files:
+            print(f"  - {name}")
+    print("✅ Conversion completed successfully!" if not failed_files else
             "⚠️  Conversion completed with some errors.")
+
+def convert_audio_files():
+    """Main function to convert audio files based on user input."""
+    if not check_ffmpeg():
+        print("❌ FFmpeg is not installed or not available in PATH!")
+        print("Please install FFmpeg from https://ffmpeg.org/download.html")
+        return
+    
+    print("✅ FFmpeg found!")
+    
+    # Get user input
+    (source_path, dest_path, mode, targets, overwrite, workers,
+     incremental, use_hash, recursive, stream_copy, normalize, dedupe) = get_user_input()
+    
+    print(f"\nSource: {source_path}")
+    print(f"Destination: {dest_path}")
+    print(f"Mode: {'Single file' if mode == 'single' else 'Folder (with subfolders)' if recursive else 'Folder'}")
+    for target in targets:
+        print(f"Output format: {target['format'].upper()}")
+        print(f"  Quality: {target['quality']} (0=highest, 9=lowest)")
+        print(f"  Bitrate: {target['bitrate'] or 'Default'}")
+        print(f"  Sample rate: {target['sample_rate'] or 'Default'}")
+    print(f"Overwrite existing: {'Yes' if overwrite else 'No'}")
+    print(f"Stream copy when possible: {'Yes' if stream_copy else 'No'}")
+    print(f"Loudness normalization: {f'{normalize:g} LUFS' if normalize is not None else 'No'}")
+    print(f"Deduplicate identical files: {'Yes' if dedupe else 'No'}")
+    print(f"Incremental: {('Yes (size, date and content hash)' if use_hash else 'Yes (size and date)') if incremental else 'No'}")
+    
+    if mode == "single":
+        print(f"\nFile to convert: {Path(source_path).name}")
+        print(f"Detected input format: {Path(source_path).suffix.lower().upper()}")
+    
+    print(f"\n--- Starting conversion ---")
+    job = {"source": source_path, "dest": dest_path, "mode": mode, "recursive": recursive, "targets": targets}
+    options = {
+        "workers": workers,
+        "overwrite": overwrite,
+        "incremental": incremental,
+        "use_hash": use_hash,
+        "stream_copy": stream_copy,
+        "normalize": normalize,
+        "dedupe": dedupe,
+    }
+    results = convert([job], options)
+    
+    if not results:
+        print("No audio files found to process!" if mode == "folder" else
+              "The selected file could not be processed!")
+        if mode == "single":
+            return
+    else:
+        print_summary(results)
+    
+    # Keep converting files as they are added to the folder
+    if mode == "folder" and ask_yes_no("\nKeep watching the source folder and convert new files as they arrive?"):
+        watched_results = watch([job], options, catch_up=False)
+        if watched_results:
+            print_summary(watched_results)
     
     input("\nPress Enter to exit...")
 
+def load_job_file(path: str) -> Tuple[List[Dict], Dict]:
+    """Read jobs and options from a JSON or YAML job file.
+    
+    The file holds either a list of jobs, or {"options": {...}, "jobs": [...]}.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    
+    if Path(path).suffix.lower() in ('.yml', '.yaml'):
+        if not HAS_YAML:
+            raise ValueError("YAML job files need PyYAML (pip install pyyaml)")
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    
+    if isinstance(data, list):
+        return data, {}
+    if not isinstance(data, dict) or not isinstance(data.get("jobs"), list):
+        raise ValueError("Job file must be a list of jobs or contain a 'jobs' list")
+    return data["jobs"], data.get("options") or {}
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments for batch mode."""
+    parser = argparse.ArgumentParser(
+        description="Convert audio files with FFmpeg. Run without arguments for interactive mode."
+    )
+    parser.add_argument("job_file", nargs="?", help="JSON or YAML file listing conversion jobs")
+    parser.add_argument("--workers", type=int, help="parallel conversions (default: one per CPU core)")
+    parser.add_argument("--overwrite", action="store_true", default=None, help="overwrite existing files")
+    parser.add_argument("--incremental", action="store_true", default=None,
+                        help="only convert new or changed files")
+    parser.add_argument("--hash", dest="use_hash", action="store_true", default=None,
+                        help="compare file contents by hash in incremental mode")
+    parser.add_argument("--stream-copy", action="store_true", default=None,
+                        help="remux instead of re-encoding when the source already matches the target")
+    parser.add_argument("--normalize", nargs="?", type=float, const=DEFAULT_LOUDNESS, metavar="LUFS",
+                        help=f"normalize loudness with EBU R128 two-pass loudnorm (default target: {DEFAULT_LOUDNESS:g})")
+    parser.add_argument("--dedupe", nargs="?", const="link", choices=["link", "copy"],
+                        help="convert byte-identical sources once and hardlink (default) or copy the other outputs")
+    parser.add_argument("--quiet", action="store_true", default=None, help="only print the summary")
+    parser.add_argument("--metrics", dest="metrics_file",
+                        help="append per-conversion progress and throughput as JSON lines to this file")
+    parser.add_argument("--watch", action="store_true",
+                        help="after converting, keep converting new and changed files in the source folders")
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="seconds a file must stay unchanged before it is converted in watch mode (default: 2)")
+    parser.add_argument("--poll-interval", type=float, default=5.0,
+                        help="seconds between folder scans in watch mode without watchdog (default: 5)")
+    parser.add_argument("--results", help="write per-file results as JSON to this file ('-' for stdout)")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run interactively, or in batch mode when a job file is given; return the exit code."""
+    args = parse_args(argv)
+    if not args.job_file:
+        convert_audio_files()
+        return 0
+    
+    try:
+        jobs, options = load_job_file(args.job_file)
+    except (OSError, ValueError) as e:
+        print(f"Error reading job file '{args.job_file}': {e}")
+        return 2
+    
+    # Command line flags override the job file's options
+    for name in DEFAULT_OPTIONS:
+        if getattr(args, name, None) is not None:
+            options[name] = getattr(args, name)
+    if args.results == "-":
+        # Keep stdout clean for the JSON
+        options["quiet"] = True
+    
+    try:
+        if args.watch:
+            results = watch(jobs, options, args.settle, args.poll_interval)
+        else:
+            results = convert(jobs, options)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        print("Please install FFmpeg from https://ffmpeg.org/download.html")
+        return 1
+    
+    if args.results == "-":
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        if args.results:
+            with open(args.results, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+        print_summary(results)
+    
+    return 1 if any(result["status"] == "error" for result in results) else 0
+
 if __name__ == "__main__":
+    exit_code = 0
     try:
-        convert_audio_files()
+        exit_code = main()
     except KeyboardInterrupt:
         print("\n\nOperation cancelled by user.")
+        exit_code = 130
     except Exception as e:
-        print(f"\nUnexpected error: {e}")
\ No newline at end of file
+        print(f"\nUnexpected error: {e}")
+        exit_code = 1
+    sys.exit(exit_code)
@@ -0,0 +1,277 @@
+"""Benchmark the audio converter on synthetic corpora generated with FFmpeg.
+
+Every combination of corpus, output format, quality and worker count is
+converted in a fresh process with an empty cache and destination, and the
+results are printed as JSON: files/sec, audio seconds converted per wall
+second and peak memory of the converter and of its FFmpeg processes.
+Pass an earlier report with --baseline to see the change for each case.
+"""
+import os
+import argparse
+import importlib.util
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:
+    # Not available on Windows; memory figures are left out there
+    HAS_RESOURCE = False
+
+CONVERTER_PATH = Path(__file__).resolve().parent / "audio-converter.py"
+
+# Each corpus is a list of (file count, input format, seconds of audio per file)
+CORPORA = {
+    "short": [(200, ".wav", 2)],
+    "long": [(3, ".flac", 600)],
+    "mixed": [(15, ".wav", 20), (15, ".flac", 45), (15, ".mp3", 30), (15, ".ogg", 60)],
+}
+
+# Bump when the way corpora are generated changes, so cached corpora are rebuilt
+CORPUS_VERSION = 1
+
+def load_converter():
+    """Import audio-converter.py, whose file name isn't a valid module name."""
+    spec = importlib.util.spec_from_file_location("audio_converter", CONVERTER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def parse_list(value: str, convert=str) -> List:
+    """Split a comma separated command line value."""
+    return [convert(item.strip()) for item in value.split(",") if item.strip()]
+
+def generate_corpus(name: str, folder: Path, scale: float) -> Dict:
+    """Create a corpus of sine tones with FFmpeg's lavfi source, reusing it if it's up to date."""
+    definition = json.loads(json.dumps({"version": CORPUS_VERSION, "scale": scale, "files": CORPORA[name]}))
+    info_path = folder / "corpus.json"
+    if info_path.exists():
+        info = json.loads(info_path.read_text(encoding="utf-8"))
+        if info.get("definition") == definition:
+            return info
+    
+    shutil.rmtree(folder, ignore_errors=True)
+    folder.mkdir(parents=True)
+    print(f"Generating corpus '{name}' in {folder}...", file=sys.stderr)
+    
+    files = []
+    for count, input_format, seconds in CORPORA[name]:
+        for index in range(max(1, round(count * scale))):
+            file_path = folder / f"{input_format[1:]}_{index:04d}{input_format}"
+            # A different tone per file, so no two files are identical
+            tone = f"sine=frequency={220 + 7 * len(files)}:sample_rate=44100:duration={seconds}"
+            subprocess.run(["ffmpeg", "-nostdin", "-v", "error", "-y", "-f", "lavfi", "-i", tone,
+                            "-ac", "2", str(file_path)], check=True, capture_output=True)
+            files.append({"name": file_path.name, "seconds": seconds, "size": file_path.stat().st_size})
+    
+    info = {
+        "definition": definition,
+        "files": len(files),
+        "audio_seconds": sum(item["seconds"] for item in files),
+        "bytes": sum(item["size"] for item in files),
+    }
+    info_path.write_text(json.dumps(info, indent=2), encoding="utf-8")
+    return info
+
+def peak_rss_mb(who: int) -> Optional[float]:
+    """Peak resident memory of this process or of its largest finished child, in MB."""
+    if not HAS_RESOURCE:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run_case(case: Dict) -> Dict:
+    """Convert one corpus with one set of settings; meant to run in its own process."""
+    converter = load_converter()
+    job = {"source": case["source"], "dest": case["dest"],
+           "targets": [{"format": case["format"], "quality": case["quality"]}]}
+    
+    start = time.perf_counter()
+    results = converter.convert([job], {"workers": case["workers"], "overwrite": True, "quiet": True})
+    wall_seconds = time.perf_counter() - start
+    
+    statuses = [result["status"] for result in results]
+    return {
+        "wall_seconds": wall_seconds,
+        "converted": len(statuses) - statuses.count("error") - statuses.count("skipped"),
+        "errors": statuses.count("error"),
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF) if HAS_RESOURCE else None,
+        "peak_ffmpeg_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN) if HAS_RESOURCE else None,
+    }
+
+def measure(case: Dict, work_dir: Path) -> Dict:
+    """Run a case in a fresh process, with an empty destination and cache so runs don't help each other."""
+    dest = Path(tempfile.mkdtemp(prefix="out-", dir=work_dir))
+    cache = Path(tempfile.mkdtemp(prefix="cache-", dir=work_dir))
+    env = {**os.environ, "XDG_CACHE_HOME": str(cache), "LOCALAPPDATA": str(cache)}
+    try:
+        proc = subprocess.run([sys.executable, __file__, "--run-case", json.dumps({**case, "dest": str(dest)})],
+                              capture_output=True, text=True, env=env)
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else f"exit code {proc.returncode}")
+        return json.loads(proc.stdout)
+    finally:
+        shutil.rmtree(dest, ignore_errors=True)
+        shutil.rmtree(cache, ignore_errors=True)
+
+def summarize(case: Dict, runs: List[Dict], corpus: Dict) -> Dict:
+    """Combine repeated runs of a case into its reported figures (median time, worst memory)."""
+    wall_seconds = statistics.median(run["wall_seconds"] for run in runs)
+    memory = [run["peak_rss_mb"] for run in runs if run["peak_rss_mb"] is not None]
+    ffmpeg_memory = [run["peak_ffmpeg_rss_mb"] for run in runs if run["peak_ffmpeg_rss_mb"] is not None]
+    return {
+        "key": f"{case['corpus']}/{case['format'][1:]}/q{case['quality']}/w{case['workers']}",
+        "corpus": case["corpus"],
+        "format": case["format"],
+        "quality": case["quality"],
+        "workers": case["workers"],
+        "files": corpus["files"],
+        "audio_seconds": corpus["audio_seconds"],
+        "wall_seconds": round(wall_seconds, 3),
+        "wall_seconds_runs": [round(run["wall_seconds"], 3) for run in runs],
+        "files_per_second": round(corpus["files"] / wall_seconds, 3),
+        "audio_seconds_per_second": round(corpus["audio_seconds"] / wall_seconds, 2),
+        "peak_rss_mb": max(memory) if memory else None,
+        "peak_ffmpeg_rss_mb": max(ffmpeg_memory) if ffmpeg_memory else None,
+        "errors": max(run["errors"] for run in runs),
+    }
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Annotate each case with its change against the baseline; return the keys that got slower."""
+    if baseline.get("scale") != report["scale"]:
+        print("⚠️  Baseline was run at a different --scale; not comparing.", file=sys.stderr)
+        return []
+    
+    previous = {case["key"]: case for case in baseline.get("cases", [])}
+    regressions = []
+    for case in report["cases"]:
+        old = previous.get(case["key"])
+        if not old or not old.get("files_per_second"):
+            continue
+        speedup = case["files_per_second"] / old["files_per_second"]
+        case["baseline"] = {
+            "files_per_second": old["files_per_second"],
+            "audio_seconds_per_second": old.get("audio_seconds_per_second"),
+            "peak_rss_mb": old.get("peak_rss_mb"),
+            "speedup": round(speedup, 3),
+        }
+        if speedup < 1 - tolerance:
+            regressions.append(case["key"])
+    return regressions
+
+def ffmpeg_version() -> str:
+    """First line of `ffmpeg -version`, to tell apart reports from different builds."""
+    try:
+        proc = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True, check=True)
+        return proc.stdout.splitlines()[0]
+    except (subprocess.CalledProcessError, FileNotFoundError, IndexError):
+        return ""
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Benchmark audio-converter.py on synthetic audio.")
+    parser.add_argument("--corpora", default=",".join(CORPORA), help=f"corpora to run (default: {','.join(CORPORA)})")
+    parser.add_argument("--formats", default="mp3,ogg", help="output formats (default: mp3,ogg)")
+    parser.add_argument("--qualities", default="2", help="quality levels 0-9 (default: 2)")
+    parser.add_argument("--workers", default=",".join(sorted({"1", str(cpus)})),
+                        help=f"worker counts (default: 1,{cpus})")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case; the median is reported (default: 3)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the number of files in each corpus")
+    parser.add_argument("--corpus-dir", default=str(Path(tempfile.gettempdir()) / "audio-converter-benchmark"),
+                        help="where generated corpora are kept between runs")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="slowdown in files/sec that counts as a regression (default: 0.1)")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmark matrix and report it; return 1 if a case regressed against the baseline."""
+    args = parse_args(argv)
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))))
+        return 0
+    
+    corpora = parse_list(args.corpora)
+    unknown = [name for name in corpora if name not in CORPORA]
+    if unknown:
+        print(f"Unknown corpus: {', '.join(unknown)} (choose from {', '.join(CORPORA)})", file=sys.stderr)
+        return 2
+    formats = [fmt if fmt.startswith(".") else "." + fmt for fmt in parse_list(args.formats)]
+    
+    corpus_dir = Path(args.corpus_dir)
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    work_dir = Path(tempfile.mkdtemp(prefix="run-", dir=corpus_dir))
+    
+    report = {
+        "version": 1,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "ffmpeg": ffmpeg_version(),
+        },
+        "cases": [],
+    }
+    try:
+        for name in corpora:
+            corpus = generate_corpus(name, corpus_dir / name, args.scale)
+            for output_format in formats:
+                for quality in parse_list(args.qualities):
+                    for workers in parse_list(args.workers, int):
+                        case = {"corpus": name, "source": str(corpus_dir / name), "format": output_format,
+                                "quality": quality, "workers": workers}
+                        runs = [measure(case, work_dir) for _ in range(max(1, args.repeat))]
+                        result = summarize(case, runs, corpus)
+                        report["cases"].append(result)
+                        print(f"{result['key']:<24} {result['files_per_second']:>9.2f} files/s "
+                              f"{result['audio_seconds_per_second']:>9.1f}x realtime"
+                              + (f"  ⚠️  {result['errors']} errors" if result["errors"] else ""), file=sys.stderr)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for case in report["cases"]:
+            if "baseline" in case:
+                print(f"{case['key']:<24} {case['baseline']['speedup']:.2f}x vs baseline", file=sys.stderr)
+        report["regressions"] = regressions
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    
+    if regressions:
+        print(f"❌ Slower than the baseline: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n\nBenchmark cancelled by user.", file=sys.stderr)
+        sys.exit(130)
+    except (subprocess.CalledProcessError, RuntimeError, OSError) as e:
+        print(f"\n❌ Benchmark failed: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,375 @@
+"""Benchmark merge-folders.py on synthetic folder trees.
+
+Every combination of tree, merge mode, merge method and worker count is
+merged in a fresh process into an empty destination, and the results are
+printed as JSON: files/sec, bytes/sec, peak memory and the number of stat,
+open, mkdir and scandir calls made. Pass an earlier report with --baseline
+to see the change for each case.
+"""
+import os
+import argparse
+import importlib.util
+import io
+import json
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:
+    # Not available on Windows; memory figures are left out there
+    HAS_RESOURCE = False
+
+MERGE_PATH = Path(__file__).resolve().parent / "merge-folders.py"
+
+# Each tree is a set of top-level folders, each holding a chain of `depth` nested
+# folders with `files` files at every level. With shared_names, every folder uses
+# the same file names, so a contents-only merge has to rename almost every file.
+# `scale` says whether --scale changes the number of folders or the file sizes.
+TREES = {
+    "tiny": {"folders": 20, "depth": 1, "files": 1000, "min_size": 0, "max_size": 4096,
+             "shared_names": False, "scale": "folders"},
+    "large": {"folders": 2, "depth": 1, "files": 1, "min_size": 2 * 1024 ** 3, "max_size": 2 * 1024 ** 3,
+              "shared_names": False, "scale": "size"},
+    "deep": {"folders": 10, "depth": 40, "files": 5, "min_size": 1024, "max_size": 16384,
+             "shared_names": False, "scale": "folders"},
+    "collisions": {"folders": 200, "depth": 1, "files": 50, "min_size": 0, "max_size": 4096,
+                   "shared_names": True, "scale": "folders"},
+}
+
+MODES = ("structure", "contents")
+
+# Moving would empty the generated trees, so only methods that leave the source alone
+METHODS = ("copy", "hardlink", "reflink")
+
+# Bump when the way trees are generated changes, so cached trees are rebuilt
+TREE_VERSION = 1
+
+# Big files are written from a repeated random block instead of generating every byte
+BLOCK_SIZE = 1024 * 1024
+
+def load_merge():
+    """Import merge-folders.py, whose file name isn't a valid module name."""
+    spec = importlib.util.spec_from_file_location("merge_folders", MERGE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def parse_list(value: str, convert=str) -> List:
+    """Split a comma separated command line value."""
+    return [convert(item.strip()) for item in value.split(",") if item.strip()]
+
+def write_file(file_path: Path, size: int, rng: random.Random) -> None:
+    """Write a file of random content; big files repeat one random block with a counter so no blocks are equal."""
+    with open(file_path, "wb") as f:
+        if size <= BLOCK_SIZE:
+            f.write(rng.randbytes(size))
+            return
+        block = rng.randbytes(BLOCK_SIZE - 8)
+        for index in range(size // BLOCK_SIZE):
+            f.write(index.to_bytes(8, "little") + block)
+        f.write(rng.randbytes(size % BLOCK_SIZE))
+
+def generate_tree(name: str, folder: Path, scale: float) -> Dict:
+    """Create a tree from a fixed seed, so every run merges the same files, reusing it if it's up to date."""
+    layout = TREES[name]
+    definition = {"version": TREE_VERSION, "scale": scale, "layout": layout}
+    info_path = folder / "tree.json"
+    if info_path.exists():
+        info = json.loads(info_path.read_text(encoding="utf-8"))
+        if info.get("definition") == definition:
+            return info
+    
+    shutil.rmtree(folder, ignore_errors=True)
+    source = folder / "source"
+    source.mkdir(parents=True)
+    print(f"Generating tree '{name}' in {folder}...", file=sys.stderr)
+    
+    folders = layout["folders"]
+    min_size, max_size = layout["min_size"], layout["max_size"]
+    if layout["scale"] == "folders":
+        folders = max(1, round(folders * scale))
+    else:
+        min_size, max_size = round(min_size * scale), round(max_size * scale)
+    
+    rng = random.Random(f"{name}-{TREE_VERSION}")
+    files = total_bytes = 0
+    for folder_index in range(folders):
+        directory = source / f"folder{folder_index:04d}"
+        for level in range(layout["depth"]):
+            if level:
+                directory = directory / f"level{level:02d}"
+            directory.mkdir()
+            for file_index in range(layout["files"]):
+                prefix = "" if layout["shared_names"] else f"{folder_index:04d}_{level:02d}_"
+                size = rng.randint(min_size, max_size)
+                write_file(directory / f"{prefix}file{file_index:04d}.bin", size, rng)
+                files += 1
+                total_bytes += size
+    
+    info = {"definition": definition, "source": str(source), "files": files, "bytes": total_bytes}
+    info_path.write_text(json.dumps(info, indent=2), encoding="utf-8")
+    return info
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process, in MB."""
+    if not HAS_RESOURCE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+class CountingEntry:
+    """Wraps an os.DirEntry to count the stat calls it makes (DirEntry caches the first one)."""
+    
+    def __init__(self, entry, counts: Dict):
+        self._entry = entry
+        self._counts = counts
+        self._stats = set()
+    
+    def __getattr__(self, name):
+        return getattr(self._entry, name)
+    
+    def __fspath__(self):
+        return self._entry.path
+    
+    def stat(self, *, follow_symlinks=True):
+        if follow_symlinks not in self._stats:
+            self._stats.add(follow_symlinks)
+            self._counts["stat"] += 1
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+class CountingScandir:
+    """Wraps the iterator returned by os.scandir so its entries count their stat calls."""
+    
+    def __init__(self, iterator, counts: Dict):
+        self._iterator = iterator
+        self._counts = counts
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._iterator.close()
+    
+    def __iter__(self):
+        for entry in self._iterator:
+            yield CountingEntry(entry, self._counts)
+    
+    def close(self):
+        self._iterator.close()
+
+def count_syscalls() -> Dict:
+    """Start counting file system calls made from Python in this process, and return the live counts.
+    
+    open, mkdir and scandir come from audit events; stat covers os.stat,
+    os.lstat, os.fstat and the first stat of each scandir entry. Calls made
+    inside the kernel copy functions aren't visible from here.
+    """
+    counts = {"stat": 0, "open": 0, "mkdir": 0, "scandir": 0}
+    events = {"open": "open", "os.mkdir": "mkdir", "os.scandir": "scandir"}
+    
+    def hook(event, args):
+        name = events.get(event)
+        if name is not None:
+            counts[name] += 1
+    sys.addaudithook(hook)
+    
+    def counted(function):
+        def wrapper(*args, **kwargs):
+            counts["stat"] += 1
+            return function(*args, **kwargs)
+        return wrapper
+    for name in ("stat", "lstat", "fstat"):
+        setattr(os, name, counted(getattr(os, name)))
+    
+    scandir = os.scandir
+    os.scandir = lambda path=".": CountingScandir(scandir(path), counts)
+    return counts
+
+def run_case(case: Dict) -> Dict:
+    """Merge one tree with one set of settings; meant to run in its own process."""
+    merge = load_merge()
+    counts = count_syscalls() if case.get("count") else None
+    options = {"workers": case["workers"], "strategy": case["method"]}
+    merge_function = merge.merge_with_structure if case["mode"] == "structure" else merge.merge_contents_only
+    
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        copied, replaced, errors = merge_function(case["source"], case["dest"], "", options)
+        wall_seconds = time.perf_counter() - start
+    
+    return {
+        "wall_seconds": wall_seconds,
+        "merged": copied + replaced,
+        "errors": errors,
+        "peak_rss_mb": peak_rss_mb(),
+        "syscalls": dict(counts) if counts is not None else None,
+    }
+
+def measure(case: Dict, work_dir: Path) -> Dict:
+    """Run a case in a fresh process, merging into an empty destination on the same drive as the tree."""
+    dest = Path(tempfile.mkdtemp(prefix="out-", dir=work_dir))
+    try:
+        proc = subprocess.run([sys.executable, __file__, "--run-case", json.dumps({**case, "dest": str(dest)})],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else f"exit code {proc.returncode}")
+        return json.loads(proc.stdout)
+    finally:
+        shutil.rmtree(dest, ignore_errors=True)
+
+def summarize(case: Dict, runs: List[Dict], counted: Dict, tree: Dict) -> Dict:
+    """Combine repeated runs of a case into its reported figures (median time, worst memory)."""
+    wall_seconds = statistics.median(run["wall_seconds"] for run in runs)
+    memory = [run["peak_rss_mb"] for run in runs if run["peak_rss_mb"] is not None]
+    return {
+        "key": f"{case['tree']}/{case['mode']}/{case['method']}/w{case['workers']}",
+        "tree": case["tree"],
+        "mode": case["mode"],
+        "method": case["method"],
+        "workers": case["workers"],
+        "files": tree["files"],
+        "bytes": tree["bytes"],
+        "merged": runs[0]["merged"],
+        "wall_seconds": round(wall_seconds, 3),
+        "wall_seconds_runs": [round(run["wall_seconds"], 3) for run in runs],
+        "files_per_second": round(tree["files"] / wall_seconds, 1),
+        "bytes_per_second": round(tree["bytes"] / wall_seconds),
+        "peak_rss_mb": max(memory) if memory else None,
+        "syscalls": counted["syscalls"],
+        "errors": max(run["errors"] for run in runs),
+    }
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Annotate each case with its change against the baseline; return the keys that got slower."""
+    if baseline.get("scale") != report["scale"]:
+        print("⚠️  Baseline was run at a different --scale; not comparing.", file=sys.stderr)
+        return []
+    
+    previous = {case["key"]: case for case in baseline.get("cases", [])}
+    regressions = []
+    for case in report["cases"]:
+        old = previous.get(case["key"])
+        if not old or not old.get("wall_seconds"):
+            continue
+        speedup = old["wall_seconds"] / case["wall_seconds"] if case["wall_seconds"] else 0
+        case["baseline"] = {
+            "files_per_second": old["files_per_second"],
+            "bytes_per_second": old.get("bytes_per_second"),
+            "peak_rss_mb": old.get("peak_rss_mb"),
+            "syscalls": old.get("syscalls"),
+            "speedup": round(speedup, 3),
+        }
+        if speedup < 1 - tolerance:
+            regressions.append(case["key"])
+    return regressions
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark merge-folders.py on synthetic folder trees.")
+    parser.add_argument("--trees", default=",".join(TREES), help=f"trees to run (default: {','.join(TREES)})")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"merge modes (default: {','.join(MODES)})")
+    parser.add_argument("--methods", default="copy", help=f"merge methods from {', '.join(METHODS)} (default: copy)")
+    parser.add_argument("--workers", default="1,8", help="files copied at once (default: 1,8)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case; the median is reported (default: 3)")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiply the number of folders in each tree (the file sizes for 'large')")
+    parser.add_argument("--tree-dir", default=str(Path(tempfile.gettempdir()) / "merge-folders-benchmark"),
+                        help="where generated trees are kept between runs; merges are written next to them")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="slowdown in wall time that counts as a regression (default: 0.1)")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmark matrix and report it; return 1 if a case regressed against the baseline."""
+    args = parse_args(argv)
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))))
+        return 0
+    
+    trees, modes, methods = parse_list(args.trees), parse_list(args.modes), parse_list(args.methods)
+    for kind, chosen, known in (("tree", trees, TREES), ("mode", modes, MODES), ("method", methods, METHODS)):
+        unknown = [name for name in chosen if name not in known]
+        if unknown:
+            print(f"Unknown {kind}: {', '.join(unknown)} (choose from {', '.join(known)})", file=sys.stderr)
+            return 2
+    
+    tree_dir = Path(args.tree_dir)
+    tree_dir.mkdir(parents=True, exist_ok=True)
+    work_dir = Path(tempfile.mkdtemp(prefix="run-", dir=tree_dir))
+    
+    report = {
+        "version": 1,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "cases": [],
+    }
+    try:
+        for name in trees:
+            tree = generate_tree(name, tree_dir / name, args.scale)
+            for mode in modes:
+                for method in methods:
+                    for workers in parse_list(args.workers, int):
+                        case = {"tree": name, "source": tree["source"], "mode": mode, "method": method,
+                                "workers": workers}
+                        runs = [measure(case, work_dir) for _ in range(max(1, args.repeat))]
+                        # Counting slows every call down, so it gets a run of its own
+                        counted = measure({**case, "count": True}, work_dir)
+                        result = summarize(case, runs, counted, tree)
+                        report["cases"].append(result)
+                        print(f"{result['key']:<32} {result['files_per_second']:>10.1f} files/s "
+                              f"{result['bytes_per_second'] / (1024 * 1024):>9.1f} MB/s"
+                              + (f"  ⚠️  {result['errors']} errors" if result["errors"] else ""), file=sys.stderr)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for case in report["cases"]:
+            if "baseline" in case:
+                print(f"{case['key']:<32} {case['baseline']['speedup']:.2f}x vs baseline", file=sys.stderr)
+        report["regressions"] = regressions
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    
+    if regressions:
+        print(f"❌ Slower than the baseline: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n\nBenchmark cancelled by user.", file=sys.stderr)
+        sys.exit(130)
+    except (subprocess.CalledProcessError, RuntimeError, OSError) as e:
+        print(f"\n❌ Benchmark failed: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -1,9 +1,702 @@
 import os
+import argparse
+import errno
+import hashlib
+import json
 import shutil
+import sys
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from stat import S_ISREG
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where reflinks fall back to copies
+    fcntl = None
+
+# Number of files copied at the same time by default
+DEFAULT_WORKERS = 8
+
+# Files at least this big are copied by the kernel (copy_file_range/sendfile)
+LARGE_FILE_SIZE = 16 * 1024 * 1024
+
+# Bytes per kernel copy call, and buffer size when falling back to read/write
+KERNEL_CHUNK_SIZE = 64 * 1024 * 1024
+BUFFER_SIZE = 1024 * 1024
+
+# Errors meaning a kernel copy method isn't supported for these files, so try the next one
+UNSUPPORTED_ERRNOS = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.EPERM}
+
+# Errors meaning a link, clone or rename can't be made between these paths, so copy instead
+FALLBACK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTTY, errno.EINVAL,
+                   errno.ENOSYS, errno.EOPNOTSUPP, getattr(errno, "ENOTSUP", errno.EOPNOTSUPP)}
+
+# ioctl that makes a file share another file's data blocks (btrfs, XFS, bcachefs)
+FICLONE = 0x40049409
+
+# How files get into the destination, and the word used for it in messages
+STRATEGIES = {
+    "copy": "Copied",
+    "hardlink": "Linked",
+    "reflink": "Cloned",
+    "move": "Moved",
+}
+
+# Bytes hashed from each end of a file to tell apart files of the same size cheaply
+PARTIAL_HASH_SIZE = 64 * 1024
+
+# Where skipped duplicates are listed in the destination when dedupe is "alias"
+DUPLICATES_FILENAME = ".merge-duplicates.tsv"
+
+# Append-only record of finished files in the destination, used to resume merges
+JOURNAL_FILENAME = ".merge-journal.jsonl"
+
+# Files are written under a temporary name ending in this and renamed when complete
+PARTIAL_SUFFIX = ".merge-partial"
+
+# Path, size, modification time and SHA-256 of every file merged with verify on
+MANIFEST_FILENAME = ".merge-manifest.jsonl"
+
+# Files the script keeps in the destination, which aren't merged content
+METADATA_FILENAMES = {DUPLICATES_FILENAME, JOURNAL_FILENAME, MANIFEST_FILENAME}
+
+# Seconds between updates of the progress line, and between progress lines when the output isn't a terminal
+PROGRESS_INTERVAL = 0.25
+PROGRESS_LOG_INTERVAL = 10
+
+# Buffer for the per-file log, so a merge of millions of files doesn't write every line separately
+LOG_BUFFER_SIZE = 1024 * 1024
+
+# Steps of a merge whose time is measured, in the order they are reported
+PHASES = ("walk", "stat", "mkdir", "copy")
+
+# Archive formats a merge can be written to, by file extension, with the tarfile mode that
+# streams them (zip archives are written with zipfile)
+ARCHIVE_FORMATS = {
+    "tar": "w|",
+    "tar.gz": "w|gz",
+    "tgz": "w|gz",
+    "tar.bz2": "w|bz2",
+    "tar.xz": "w|xz",
+    "zip": None,
+}
+
+DEFAULT_OPTIONS = {
+    "workers": DEFAULT_WORKERS,
+    "strategy": "copy",
+    "dedupe": None,  # "skip" or "alias" to not copy files whose content is already in the destination
+    "dry_run": False,
+    "sync": False,  # copy files again if they changed since they were merged
+    "log": None,  # path of a JSON-lines file listing what happened to every file
+    "verify": False,  # hash files while copying them and write a manifest of the destination
+    "count": False,  # list the source folders a second time in the background to show the time left
+    "archive": None,  # a format from ARCHIVE_FORMATS to write the merge into an archive instead of a folder
+}
+
+def copy_large_file(source_file_path, destination_file_path):
+    """Copy a big file without passing its data through Python when the OS allows it"""
+    with open(source_file_path, "rb") as source, open(destination_file_path, "wb") as destination:
+        size = os.fstat(source.fileno()).st_size
+        copied = 0
+        
+        for method in ("copy_file_range", "sendfile"):
+            if not hasattr(os, method):
+                continue
+            try:
+                while copied < size:
+                    count = min(KERNEL_CHUNK_SIZE, size - copied)
+                    if method == "copy_file_range":
+                        sent = os.copy_file_range(source.fileno(), destination.fileno(), count, copied, copied)
+                    else:
+                        os.lseek(destination.fileno(), copied, os.SEEK_SET)
+                        sent = os.sendfile(destination.fileno(), source.fileno(), copied, count)
+                    if sent == 0:
+                        break
+                    copied += sent
+                break
+            except OSError as e:
+                if e.errno not in UNSUPPORTED_ERRNOS:
+                    raise
+        
+        # Buffered copy of whatever the kernel didn't copy
+        source.seek(copied)
+        destination.seek(copied)
+        shutil.copyfileobj(source, destination, BUFFER_SIZE)
+    
+    shutil.copystat(source_file_path, destination_file_path)
+
+def copy_file(source_file_path, destination_file_path):
+    """Copy a file with its metadata, like shutil.copy2"""
+    if os.path.isdir(destination_file_path):
+        destination_file_path = os.path.join(destination_file_path, os.path.basename(source_file_path))
+    if os.path.getsize(source_file_path) >= LARGE_FILE_SIZE:
+        copy_large_file(source_file_path, destination_file_path)
+    else:
+        shutil.copy2(source_file_path, destination_file_path)
+
+def copy_and_hash(source_file_path, destination_file_path):
+    """Copy a file with its metadata and return the SHA-256 of its data, reading it only once"""
+    sha256 = hashlib.sha256()
+    buffer = bytearray(BUFFER_SIZE)
+    view = memoryview(buffer)
+    # Unbuffered, so the data isn't copied into another buffer on the way
+    with open(source_file_path, "rb", buffering=0) as source, open(destination_file_path, "wb", buffering=0) as destination:
+        while True:
+            count = source.readinto(buffer)
+            if not count:
+                break
+            sha256.update(view[:count])
+            written = 0
+            while written < count:
+                written += destination.write(view[written:count])
+    shutil.copystat(source_file_path, destination_file_path)
+    return sha256.hexdigest()
+
+def reflink_file(source_file_path, destination_file_path):
+    """Make destination share the source's data blocks instead of copying them"""
+    with open(source_file_path, "rb") as source, open(destination_file_path, "wb") as destination:
+        fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+    shutil.copystat(source_file_path, destination_file_path)
+
+def transfer_file(source_file_path, destination_file_path, strategy="copy", checksum=False):
+    """Put a file at destination using a merge strategy; return the strategy that worked and the file's hash
+    
+    Hardlinks, reflinks and renames only work within one file system (and
+    reflinks only on some), so they fall back to copying; a move then deletes
+    the source after copying it. Data is written under a temporary name and
+    renamed into place, so an interrupted merge never leaves half a file
+    under the real name. With checksum, copies hash the data as it's copied,
+    and links, clones and moves, which don't read it, hash the result; the
+    hash is None otherwise.
+    """
+    if os.path.isdir(destination_file_path):
+        destination_file_path = os.path.join(destination_file_path, os.path.basename(source_file_path))
+    temp_path = os.path.join(os.path.dirname(destination_file_path),
+                             f".{os.path.basename(destination_file_path)}{PARTIAL_SUFFIX}")
+    
+    try:
+        try:
+            if strategy == "hardlink":
+                try:
+                    os.link(source_file_path, temp_path)
+                except FileExistsError:
+                    # Left over from an interrupted merge
+                    os.remove(temp_path)
+                    os.link(source_file_path, temp_path)
+                os.replace(temp_path, destination_file_path)
+                return strategy, full_hash(destination_file_path) if checksum else None
+            if strategy == "reflink" and fcntl is not None:
+                reflink_file(source_file_path, temp_path)
+                os.replace(temp_path, destination_file_path)
+                return strategy, full_hash(destination_file_path) if checksum else None
+            if strategy == "move":
+                os.replace(source_file_path, destination_file_path)
+                return strategy, full_hash(destination_file_path) if checksum else None
+        except OSError as e:
+            if e.errno not in FALLBACK_ERRNOS:
+                raise
+        
+        digest = None
+        if checksum:
+            digest = copy_and_hash(source_file_path, temp_path)
+        else:
+            copy_file(source_file_path, temp_path)
+        os.replace(temp_path, destination_file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    
+    if strategy == "move":
+        os.remove(source_file_path)
+    return "copy", digest
+
+def partial_hash(file_path, size):
+    """Hash the first and last bytes of a file"""
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        sha256.update(f.read(PARTIAL_HASH_SIZE))
+        if size > PARTIAL_HASH_SIZE:
+            f.seek(max(PARTIAL_HASH_SIZE, size - PARTIAL_HASH_SIZE))
+            sha256.update(f.read(PARTIAL_HASH_SIZE))
+    return sha256.hexdigest()
+
+def full_hash(file_path):
+    """Hash a whole file"""
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(BUFFER_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+class ContentIndex:
+    """Finds files in the destination with the same content as a source file
+    
+    Files are grouped by size, and a head/tail hash and then a full hash are
+    only computed for files whose size matches, once per file.
+    """
+    
+    def __init__(self, folder):
+        self.by_size = {}
+        self.hashes = {}
+        if folder is None or not os.path.isdir(folder):
+            return
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if (entry.is_file(follow_symlinks=False) and entry.name not in METADATA_FILENAMES
+                        and not entry.name.endswith(PARTIAL_SUFFIX)):
+                    self.add(entry.path, entry.path, entry.stat().st_size)
+    
+    def _hash(self, entry, kind):
+        """Get a hash of an indexed file, computing it the first time it's needed"""
+        read_path, destination_file_path, size = entry
+        # Keyed on where the data is read from, so a source hashed while it was looked up
+        # isn't hashed again once it's added under its destination path
+        hashes = self.hashes.setdefault(read_path, {})
+        if kind not in hashes:
+            # Files still being copied are read from their source, moved ones from the destination
+            try:
+                hashes[kind] = partial_hash(read_path, size) if kind == "partial" else full_hash(read_path)
+            except FileNotFoundError:
+                hashes[kind] = (partial_hash(destination_file_path, size) if kind == "partial"
+                                else full_hash(destination_file_path))
+        return hashes[kind]
+    
+    def find(self, source_file_path, size):
+        """Return the destination file with the same content as the source, or None"""
+        candidates = self.by_size.get(size)
+        if not candidates:
+            return None
+        source = (source_file_path, source_file_path, size)
+        for candidate in candidates:
+            if (self._hash(candidate, "partial") == self._hash(source, "partial")
+                    and self._hash(candidate, "full") == self._hash(source, "full")):
+                return candidate[1]
+        return None
+    
+    def add(self, read_path, destination_file_path, size):
+        """Index a file that is (or is about to be) in the destination"""
+        self.by_size.setdefault(size, []).append((read_path, destination_file_path, size))
+
+class NameIndex:
+    """Names taken in a folder, with the next free _N suffix for each file name
+    
+    Built from one scandir pass and updated as files are placed, so picking a
+    name for a conflicting file never checks the file system.
+    """
+    
+    def __init__(self, folder):
+        self.existing = set()  # files that were there before this merge
+        self.files = set()  # names given to files in this merge
+        self.folders = set()
+        self.next_suffix = {}
+        if folder is None or not os.path.isdir(folder):
+            # Not created yet (e.g. in a dry run), or an archive
+            return
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    self.folders.add(os.path.normcase(entry.name))
+                elif not entry.name.endswith(PARTIAL_SUFFIX):
+                    # Temporary files of an interrupted merge are overwritten, not kept
+                    self.existing.add(os.path.normcase(entry.name))
+    
+    def is_taken(self, name):
+        """Whether a file or folder with this name is (or will be) in the folder"""
+        key = os.path.normcase(name)
+        return key in self.existing or key in self.files or key in self.folders
+    
+    def existed(self, name):
+        """Whether a file with this name was in the folder before this merge"""
+        return os.path.normcase(name) in self.existing
+    
+    def is_folder(self, name):
+        """Whether the name is taken by a folder"""
+        return os.path.normcase(name) in self.folders
+    
+    def claim(self, name):
+        """Mark a name as taken by a file being placed"""
+        self.files.add(os.path.normcase(name))
+    
+    def claim_unique(self, file_name):
+        """Take and return the first free name_N.ext for a file name"""
+        base_name, ext = os.path.splitext(file_name)
+        counter = self.next_suffix.get(os.path.normcase(file_name), 1)
+        while self.is_taken(f"{base_name}_{counter}{ext}"):
+            counter += 1
+        self.next_suffix[os.path.normcase(file_name)] = counter + 1
+        new_name = f"{base_name}_{counter}{ext}"
+        self.claim(new_name)
+        return new_name
+
+class MergeJournal:
+    """Append-only record, kept in the destination, of the files a merge has finished
+    
+    A merge that was interrupted and is started again skips the files listed
+    here without looking at the destination. Each line is a JSON object with
+    the source path, the destination path relative to the destination folder,
+    and the source's size and modification time when it was merged. The
+    journal is removed once a merge finishes without errors, so it only ever
+    covers an unfinished merge.
+    """
+    
+    def __init__(self, destination_path):
+        self.destination_path = destination_path
+        self.path = os.path.join(destination_path, JOURNAL_FILENAME)
+        self.done = {}
+        self.destinations = set()
+        self.file = None
+        # Copy threads add their files as soon as they're in place
+        self.lock = threading.Lock()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self.done[record["source"]] = (record["destination"], record["size"], record["mtime_ns"])
+                        self.destinations.add(record["destination"])
+                    except (ValueError, KeyError):
+                        # The last line may be cut off if the merge was killed
+                        continue
+        except FileNotFoundError:
+            pass
+    
+    def has_destination(self, relative_path):
+        """Whether a destination file (relative to the destination folder) was journaled by an earlier run"""
+        return relative_path in self.destinations
+    
+    def lookup(self, source_file_path):
+        """Return (destination relative path, size, mtime_ns) if a source file was merged before"""
+        return self.done.get(source_file_path)
+    
+    def record(self, source_file_path, destination_file_path, size, mtime_ns):
+        """Add a finished file to the journal; safe to call from any thread"""
+        relative_path = os.path.relpath(destination_file_path, self.destination_path)
+        line = json.dumps({"source": source_file_path, "destination": relative_path,
+                           "size": size, "mtime_ns": mtime_ns}, ensure_ascii=False) + "\n"
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, "a", encoding="utf-8")
+            self.file.write(line)
+            # Hand every line to the OS right away so a killed merge doesn't lose it
+            self.file.flush()
+            self.done[source_file_path] = (relative_path, size, mtime_ns)
+    
+    def close(self, complete=False):
+        """Close the journal file, removing it if the merge it covers is complete"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if complete:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+class MergeManifest:
+    """Append-only list, kept in the destination, of the size, modification time and hash of merged files
+    
+    Each line is a JSON object with the path relative to the destination
+    folder; when a path appears more than once, the last line counts.
+    """
+    
+    def __init__(self, destination_path):
+        self.destination_path = destination_path
+        self.path = os.path.join(destination_path, MANIFEST_FILENAME)
+        self.entries = {}
+        self.file = None
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self.entries[record["path"]] = (record["size"], record["mtime_ns"], record["sha256"])
+                    except (ValueError, KeyError):
+                        # The last line may be cut off if the merge was killed
+                        continue
+        except FileNotFoundError:
+            pass
+    
+    def record(self, destination_file_path, size, mtime_ns, digest):
+        """Add a file to the manifest, replacing what was known about it"""
+        if self.file is None:
+            self.file = open(self.path, "a", encoding="utf-8")
+        relative_path = os.path.relpath(destination_file_path, self.destination_path)
+        self.file.write(json.dumps({"path": relative_path, "size": size, "mtime_ns": mtime_ns,
+                                    "sha256": digest}, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self.entries[relative_path] = (size, mtime_ns, digest)
+    
+    def close(self):
+        """Close the manifest file"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class PhaseTimers:
+    """Adds up the time spent in each step of a merge, from any thread"""
+    
+    def __init__(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.lock = threading.Lock()
+    
+    def add(self, phase, seconds):
+        """Add time spent in a phase"""
+        with self.lock:
+            self.seconds[phase] += seconds
+    
+    def summary(self):
+        """Describe the time spent in each phase"""
+        return ", ".join(f"{phase} {seconds:.1f}s" for phase, seconds in self.seconds.items())
+
+class ProgressReporter:
+    """Shows a single progress line during a merge instead of a line per file
+    
+    The line shows files per second, MB/s and, once the source folders have
+    been counted, the time left. It's redrawn a few times per second on a
+    terminal, and every few seconds otherwise. What happened to each file
+    can be written to a JSON-lines log, which is buffered.
+    """
+    
+    def __init__(self, log_path=None):
+        self.timers = PhaseTimers()
+        self.log = open(log_path, "w", encoding="utf-8", buffering=LOG_BUFFER_SIZE) if log_path else None
+        self.interactive = sys.stdout.isatty()
+        self.interval = PROGRESS_INTERVAL if self.interactive else PROGRESS_LOG_INTERVAL
+        self.started = time.monotonic()
+        self.next_refresh = self.started + self.interval
+        self.line_length = 0
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.errors = 0
+        self.total_files = None
+    
+    def count_files(self, folders):
+        """Count the files to merge in the background, so the progress line can show the time left
+        
+        This lists every source folder a second time, so merges only do it when asked to.
+        """
+        def count():
+            total = 0
+            for folder in folders:
+                for directory, entry, error in walk_files(folder):
+                    if entry is not None:
+                        total += 1
+            self.total_files = total
+        threading.Thread(target=count, daemon=True).start()
+    
+    def file_done(self, label, size, kind="new", method="copy"):
+        """Count a file that was put into the destination; kind is as for CopyEngine.copy"""
+        self.files += 1
+        self.bytes += size
+        if self.log is not None:
+            record = {"event": STRATEGIES[method].lower(), "kind": kind, "path": label, "size": size}
+            self.log.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.refresh()
+    
+    def file_skipped(self, label, reason):
+        """Count a file that was left out"""
+        self.skipped += 1
+        if self.log is not None:
+            self.log.write(json.dumps({"event": "skipped", "path": label, "reason": reason}, ensure_ascii=False) + "\n")
+        self.refresh()
+    
+    def error(self, message):
+        """Print an error on its own line"""
+        self.errors += 1
+        self.message(message)
+        if self.log is not None:
+            self.log.write(json.dumps({"event": "error", "message": message}, ensure_ascii=False) + "\n")
+    
+    def message(self, text):
+        """Print a line without mixing it into the progress line"""
+        self.clear()
+        print(text)
+        self.refresh(force=True)
+    
+    def clear(self):
+        """Erase the progress line from the terminal"""
+        if self.line_length:
+            print("\r" + " " * self.line_length + "\r", end="")
+            self.line_length = 0
+    
+    def status(self):
+        """Describe the progress so far"""
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        done = self.files + self.skipped + self.errors
+        line = f"{self.files} files ({format_size(self.bytes)})"
+        if self.total_files is not None:
+            line = f"{done}/{self.total_files} files, {format_size(self.bytes)}"
+        line += f" | {self.files / elapsed:.1f} files/s, {self.bytes / elapsed / (1024 * 1024):.1f} MB/s"
+        if self.total_files is not None and done:
+            remaining = max(self.total_files - done, 0) * elapsed / done
+            line += f" | ETA {int(remaining // 3600)}:{int(remaining % 3600 // 60):02d}:{int(remaining % 60):02d}"
+        if self.skipped:
+            line += f" | {self.skipped} skipped"
+        if self.errors:
+            line += f" | {self.errors} errors"
+        return line
+    
+    def refresh(self, force=False):
+        """Redraw the progress line if it's time to"""
+        now = time.monotonic()
+        if not force and now < self.next_refresh:
+            return
+        self.next_refresh = now + self.interval
+        line = self.status()
+        if self.interactive:
+            print("\r" + line.ljust(self.line_length), end="", flush=True)
+            self.line_length = len(line)
+        elif not force:
+            print(line, flush=True)
+    
+    def close(self):
+        """Print the final progress and the time spent in each phase, and close the log"""
+        self.clear()
+        print(self.status())
+        print(f"Finished in {time.monotonic() - self.started:.1f}s "
+              f"(time spent: {self.timers.summary()}; copy time is added up over all threads)")
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+def archive_format(path):
+    """Return the archive format for a destination path from its extension, or None for a folder"""
+    for name in sorted(ARCHIVE_FORMATS, key=len, reverse=True):
+        if path.lower().endswith("." + name):
+            return name
+    return None
+
+class ArchiveWriter:
+    """Streams files into a tar (optionally compressed) or zip archive, at a path or on stdout ("-")
+    
+    Files are read in chunks and written as they come, and nothing is kept
+    per file for tar archives, so memory use doesn't grow with the merge (zip
+    archives keep a small directory entry per file for the end of the file).
+    An archive written to a path is created under a temporary name and only
+    renamed into place once it's complete.
+    """
+    
+    def __init__(self, path, format_name):
+        self.path = path
+        if path == "-":
+            # The real stdout; messages are sent to stderr while an archive is written there
+            target = sys.__stdout__.buffer
+            self.temp_path = None
+        else:
+            self.temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}{PARTIAL_SUFFIX}")
+            target = self.temp_path
+        
+        mode = ARCHIVE_FORMATS[format_name]
+        if mode is None:
+            self.zip = zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED, allowZip64=True)
+            self.tar = None
+        elif path == "-":
+            self.tar = tarfile.open(mode=mode, fileobj=target, bufsize=BUFFER_SIZE)
+            self.zip = None
+        else:
+            self.tar = tarfile.open(target, mode, bufsize=BUFFER_SIZE)
+            self.zip = None
+    
+    def add(self, source_file_path, name):
+        """Add a file to the archive under a name (a path relative to the archive's root)"""
+        if self.zip is not None:
+            self.zip.write(source_file_path, name)
+            return
+        # Open first, so a file that can't be read doesn't leave a header without data
+        with open(source_file_path, "rb") as f:
+            info = self.tar.gettarinfo(arcname=name, fileobj=f)
+            self.tar.addfile(info, f)
+        # tarfile remembers every member it wrote, which is only needed for reading
+        self.tar.members.clear()
+    
+    def close(self, complete=True):
+        """Finish the archive, and put it in place unless the merge was interrupted"""
+        (self.zip or self.tar).close()
+        if self.temp_path is None:
+            sys.__stdout__.buffer.flush()
+        elif complete:
+            os.replace(self.temp_path, self.path)
+        else:
+            os.remove(self.temp_path)
+
+class CopyEngine:
+    """Puts files into the destination on a pool of threads and counts what was copied, replaced or failed"""
+    
+    def __init__(self, workers=DEFAULT_WORKERS, strategy="copy", journal=None, reporter=None, manifest=None):
+        self.strategy = strategy
+        self.journal = journal
+        self.manifest = manifest
+        self.reporter = reporter if reporter is not None else ProgressReporter()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        # Bound the queue so huge trees don't pile up millions of pending copies
+        self.max_pending = max(1, workers) * 4
+        self.pending = {}
+        self.copied = 0
+        self.replaced = 0
+        self.errors = 0
+    
+    def copy(self, source_file_path, destination_file_path, label, kind="new", size=0, mtime_ns=0):
+        """Queue a copy; kind is "new", "renamed", "replaced" or "updated" and is reported when it's done"""
+        while len(self.pending) >= self.max_pending:
+            self._collect(wait(self.pending, return_when=FIRST_COMPLETED).done)
+        future = self.executor.submit(self._transfer, source_file_path, destination_file_path, size, mtime_ns)
+        self.pending[future] = (source_file_path, destination_file_path, label, kind, size, mtime_ns)
+    
+    def _transfer(self, source_file_path, destination_file_path, size, mtime_ns):
+        """Put one file into the destination on a worker thread, timing it; return (strategy, hash, stat)"""
+        started = time.perf_counter()
+        try:
+            used, digest = transfer_file(source_file_path, destination_file_path, self.strategy,
+                                         checksum=self.manifest is not None)
+            # Journal the file as soon as it's in place, not when the main thread gets to it,
+            # so a killed merge doesn't copy finished files again under new names
+            if self.journal is not None:
+                self.journal.record(source_file_path, destination_file_path, size, mtime_ns)
+            # The manifest needs the time the destination really got (some drives round it)
+            stat = os.stat(destination_file_path) if self.manifest is not None else None
+            return used, digest, stat
+        finally:
+            self.reporter.timers.add("copy", time.perf_counter() - started)
+    
+    def _collect(self, futures):
+        """Count and report finished copies"""
+        for future in futures:
+            source_file_path, destination_file_path, label, kind, size, mtime_ns = self.pending.pop(future)
+            file_name = os.path.basename(source_file_path)
+            try:
+                used, digest, stat = future.result()
+            except PermissionError as e:
+                self.reporter.error(f"Permission error with file '{file_name}': {e}")
+                self.errors += 1
+            except Exception as e:
+                self.reporter.error(f"Error processing file '{file_name}': {e}")
+                self.errors += 1
+            else:
+                # The method differs from the strategy when it fell back to copying, e.g. across drives
+                self.reporter.file_done(label, size, kind, used)
+                if self.manifest is not None:
+                    self.manifest.record(destination_file_path, stat.st_size, stat.st_mtime_ns, digest)
+                if kind in ("replaced", "updated"):
+                    self.replaced += 1
+                else:
+                    self.copied += 1
+    
+    def finish(self):
+        """Wait for every queued copy and return (copied, replaced, errors)"""
+        self._collect(wait(self.pending).done)
+        self.executor.shutdown()
+        return self.copied, self.replaced, self.errors
 
 def get_user_input():
     """Get user input for paths and merge type"""
-    print("=== Folder Merge Script ===\n")
     
     # Get source path
     while True:
@@ -21,12 +714,43 @@ def get_user_input():
     
     # Get destination path
     while True:
-        dest_path = input("Enter destination path (where merged files will go): ").strip()
+        dest_path = input("Enter destination path (where merged files will go, or an archive file like merged.zip): ").strip()
         if not dest_path:
             print("Please enter a valid path.")
             continue
         break
     
+    # Archives are written one file at a time, by reading the files
+    archive = archive_format(dest_path)
+    workers = DEFAULT_WORKERS
+    strategy = "copy"
+    if archive:
+        print(f"The merge will be written into a {archive} archive.")
+    
+    # Get number of parallel copies
+    while not archive:
+        workers_input = input(f"Number of files to copy at once (default: {DEFAULT_WORKERS}): ").strip()
+        if not workers_input:
+            workers = DEFAULT_WORKERS
+            break
+        if workers_input.isdigit() and int(workers_input) >= 1:
+            workers = int(workers_input)
+            break
+        print("Please enter a positive number or leave blank.")
+    
+    # Get how files are put into the destination
+    while not archive:
+        print("\nMerge method:")
+        print("1. Copy files (default)")
+        print("2. Hardlink files (instant, no extra space; same drive only, both names share one file)")
+        print("3. Reflink files (instant copy-on-write clone on btrfs/XFS; same drive only)")
+        print("4. Move files (instant on the same drive; removes them from the source)")
+        method = input("Choose method (1-4, Enter for 1): ").strip() or "1"
+        if method in ("1", "2", "3", "4"):
+            strategy = list(STRATEGIES)[int(method) - 1]
+            break
+        print("Please enter a number from 1 to 4.")
+    
     # Get merge type
     while True:
         print("\nMerge options:")
@@ -43,147 +767,602 @@ def get_user_input():
         else:
             print("Please enter 1 or 2.")
     
-    return source_path, dest_path, merge_type
+    # Get what to do with files whose content is already in the destination
+    dedupe = None
+    while merge_type == "contents":
+        print("\nFiles with the same content as a file already merged:")
+        print("1. Copy them with a new name (default)")
+        print("2. Skip them")
+        print(f"3. Skip them and list them in {DUPLICATES_FILENAME}")
+        choice = input("Choose option (1-3, Enter for 1): ").strip() or "1"
+        if choice in ("1", "2", "3"):
+            dedupe = {"1": None, "2": "skip", "3": "alias"}[choice]
+            break
+        print("Please enter a number from 1 to 3.")
+    
+    # Ask whether to only show what would happen
+    while True:
+        answer = input("\nDry run (only list what would be done, without changing anything)? (y/n): ").strip().lower()
+        if answer in ("y", "yes", "n", "no"):
+            dry_run = answer in ("y", "yes")
+            break
+        print("Please enter 'y' or 'n'.")
+    
+    # Ask whether files merged before should be copied again if they changed
+    sync = False
+    while not archive:
+        answer = input("Sync mode (copy files again if their size or date changed since they were merged)? (y/n): ").strip().lower()
+        if answer in ("y", "yes", "n", "no"):
+            sync = answer in ("y", "yes")
+            break
+        print("Please enter 'y' or 'n'.")
+    
+    # Ask whether to hash files as they're copied, to check the merge later
+    verify = False
+    while not dry_run and not archive:
+        answer = input(f"Verify mode (hash files while copying and list them in {MANIFEST_FILENAME})? (y/n): ").strip().lower()
+        if answer in ("y", "yes", "n", "no"):
+            verify = answer in ("y", "yes")
+            break
+        print("Please enter 'y' or 'n'.")
+    
+    # Counting the files lists every folder twice, which is slow on network drives
+    count = False
+    while not dry_run:
+        answer = input("Count the files first to show the time left (lists the source folders twice)? (y/n, Enter for n): ").strip().lower() or "n"
+        if answer in ("y", "yes", "n", "no"):
+            count = answer in ("y", "yes")
+            break
+        print("Please enter 'y' or 'n'.")
+    
+    # Ask where to list what happened to every file, instead of printing a line per file
+    log = None
+    if not dry_run:
+        log = input("Log file listing every file (JSON lines, press Enter for none): ").strip() or None
+    
+    options = {"workers": workers, "strategy": strategy, "dedupe": dedupe, "dry_run": dry_run, "sync": sync,
+               "log": log, "verify": verify, "count": count, "archive": archive}
+    return source_path, dest_path, merge_type, options
 
-def merge_with_structure(base_source_path, destination_path, destination_folder_name):
-    """Merge folders preserving directory structure"""
-    print(f"\n--- Merging with folder structure preserved ---")
+def list_source_folders(base_source_path, destination_folder_name):
+    """Get all folders in the base path except the destination folder"""
+    # Absolute paths, so the journal matches files however the source was typed
+    with os.scandir(os.path.abspath(base_source_path)) as entries:
+        return [entry.path for entry in entries if entry.is_dir() and entry.name != destination_folder_name]
+
+def walk_files(folder, timers=None):
+    """Yield (directory, entry, error) for every file below a folder, reading each directory once
     
-    # Get all folders in the base path except the destination folder
+    Like os.walk, symlinks to folders aren't followed. Folders that can't be
+    read are yielded once with entry None and the error. With timers, the time
+    spent reading folders (but not handling what's yielded) is added to "walk".
+    """
+    pending = [folder]
+    started = time.perf_counter()
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                subfolders = []
+                for entry in entries:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            subfolders.append(entry.path)
+                    else:
+                        if timers is not None:
+                            timers.add("walk", time.perf_counter() - started)
+                        yield directory, entry, None
+                        started = time.perf_counter()
+        except OSError as e:
+            yield directory, None, e
+            started = time.perf_counter()
+            continue
+        pending.extend(reversed(subfolders))
+    if timers is not None:
+        timers.add("walk", time.perf_counter() - started)
+
+def list_names(folder):
+    """Map the names in a folder to their scandir entries, or return None if it doesn't exist"""
     try:
-        all_items = os.listdir(base_source_path)
-        folders = [
-            os.path.join(base_source_path, f)
-            for f in all_items
-            if os.path.isdir(os.path.join(base_source_path, f)) and f != destination_folder_name
-        ]
-    except Exception as e:
-        print(f"Error listing directories: {e}")
-        return 0, 0, 1
+        with os.scandir(folder) as entries:
+            return {entry.name: entry for entry in entries}
+    except FileNotFoundError:
+        return None
+
+def timed_stat(entry, timers):
+    """Stat a scandir entry, adding the time to the "stat" phase"""
+    started = time.perf_counter()
+    try:
+        return entry.stat()
+    finally:
+        timers.add("stat", time.perf_counter() - started)
+
+def is_same_version(stat, other_stat):
+    """Whether two files look the same by size and modification time (to the second, like rsync)"""
+    return (stat.st_size == other_stat.st_size
+            and stat.st_mtime_ns // 1_000_000_000 == other_stat.st_mtime_ns // 1_000_000_000)
+
+def plan_journaled(entry, stat, label, destination_path, journal, sync, timers):
+    """Return the operation for a file the journal says was merged before, or None if it wasn't
     
-    total_copied = 0
-    total_replaced = 0
-    total_errors = 0
+    With sync, the destination file the journal points to is compared with
+    the source; if it's gone (or isn't a file any more) the source is planned
+    as if it had never been merged.
+    """
+    done = journal.lookup(entry.path) if journal is not None else None
+    if done is None:
+        return None
+    relative_path, size, mtime_ns = done
+    if not sync:
+        return ("skip", label, "already merged")
+    destination_file_path = os.path.join(destination_path, relative_path)
+    started = time.perf_counter()
+    try:
+        destination_stat = os.stat(destination_file_path)
+    except FileNotFoundError:
+        return None
+    finally:
+        timers.add("stat", time.perf_counter() - started)
+    if not S_ISREG(destination_stat.st_mode):
+        return None
+    if is_same_version(stat, destination_stat):
+        return ("skip", label, "already merged")
+    # Changed since it was merged: copy it over the same destination file
+    return ("copy", entry.path, destination_file_path, label, stat.st_size, "updated", stat.st_mtime_ns)
+
+def plan_with_structure(base_source_path, destination_path, folders, journal=None, sync=False, timers=None,
+                        fresh=False):
+    """Yield the operations of a merge that keeps the folder structure
     
+    Operations are tuples: ("folder", name), ("mkdir", path),
+    ("copy", source, destination, label, size, kind, mtime_ns),
+    ("skip", label, reason), ("duplicate", source, label, existing name) and
+    ("error", message). Each destination folder is listed once instead of
+    checking every file. With sync, files that differ from the destination in
+    size or modification time are copied again. Time spent reading folders and
+    file details is added to timers. With fresh, the destination is taken to
+    be empty without looking at it (for archives, whose destination paths
+    are relative to the archive's root).
+    """
+    if timers is None:
+        timers = PhaseTimers()
+    base_source_path = os.path.abspath(base_source_path)
+    created_dirs = set()
     for folder in folders:
-        print(f"\nProcessing folder: {os.path.basename(folder)}")
+        yield ("folder", os.path.basename(folder))
+        current_directory = None
         
+        for directory, entry, error in walk_files(folder, timers):
+            if error is not None:
+                yield ("error", f"Error processing folder '{directory}': {error}")
+                continue
+            
+            if directory != current_directory:
+                # Get the relative path from base source to the folder, once per folder
+                current_directory = directory
+                relative_dir = os.path.relpath(directory, base_source_path)
+                dest_dir = os.path.join(destination_path, relative_dir)
+                dest_error = None
+                started = time.perf_counter()
+                try:
+                    existing = list_names(dest_dir) if not fresh else None
+                except OSError as e:
+                    # e.g. a file in the way of the folder, or a folder that can't be read
+                    existing = {}
+                    dest_error = e
+                timers.add("walk", time.perf_counter() - started)
+                if dest_error is not None:
+                    yield ("error", f"Error reading destination folder '{dest_dir}': {dest_error}")
+                elif existing is None:
+                    existing = {}
+                    if dest_dir not in created_dirs:
+                        created_dirs.add(dest_dir)
+                        yield ("mkdir", dest_dir)
+            
+            if dest_error is not None:
+                # Already reported once for the folder; skip its files
+                continue
+            
+            try:
+                relative_path = os.path.join(relative_dir, entry.name)
+                destination_file_path = os.path.join(dest_dir, entry.name)
+                stat = timed_stat(entry, timers)
+                operation = plan_journaled(entry, stat, relative_path, destination_path, journal, sync, timers)
+                if operation is not None:
+                    yield operation
+                    continue
+                
+                destination_entry = existing.get(entry.name)
+                if destination_entry is None:
+                    kind = "new"
+                elif destination_entry.is_dir():
+                    # If the existing destination is not a file, replace it
+                    kind = "replaced"
+                elif sync and not is_same_version(stat, timed_stat(destination_entry, timers)):
+                    kind = "updated"
+                else:
+                    yield ("skip", relative_path, "already exists")
+                    continue
+                yield ("copy", entry.path, destination_file_path, relative_path, stat.st_size, kind, stat.st_mtime_ns)
+            except PermissionError as e:
+                yield ("error", f"Permission error with file '{entry.name}': {e}")
+            except Exception as e:
+                yield ("error", f"Error processing file '{entry.name}': {e}")
+
+def find_unjournaled_copy(names, journal, destination_path, file_name, stat, adopted):
+    """Return the name of a copy of a source that is in the destination but not in the journal, or None
+    
+    Such a copy was put in place by a killed merge, or by an earlier merge
+    that finished (and removed its journal). It has the source's name (or
+    name_N) and the same size and modification time, and no journal line
+    claims it. Only files that were in the destination before this run are
+    considered, and each only once.
+    """
+    base_name, ext = os.path.splitext(file_name)
+    candidate = file_name
+    counter = 1
+    while names.existed(candidate):
+        if candidate not in adopted and not journal.has_destination(candidate):
+            try:
+                other = os.stat(os.path.join(destination_path, candidate))
+                if other.st_size == stat.st_size and other.st_mtime_ns == stat.st_mtime_ns:
+                    adopted.add(candidate)
+                    return candidate
+            except OSError:
+                pass
+        candidate = f"{base_name}_{counter}{ext}"
+        counter += 1
+    return None
+
+def plan_contents_only(base_source_path, destination_path, folders, dedupe=None, journal=None, sync=False,
+                       timers=None, fresh=False):
+    """Yield the operations of a merge that flattens every file into the destination
+    
+    Operations are the same as for plan_with_structure. Conflicting names get
+    a _N suffix, and with dedupe, files whose content is already in the
+    destination become "duplicate" operations. Names can't tell whether a
+    destination file came from a source, so with sync, a file counts as
+    merged when its name (or name_N) holds a file of the same size and
+    modification time; a changed file is only copied over its earlier copy
+    while the journal of an unfinished merge lists it. fresh works as for
+    plan_with_structure.
+    """
+    if timers is None:
+        timers = PhaseTimers()
+    # Includes names handed to copies that may not have been written yet
+    names = NameIndex(None if fresh else destination_path)
+    index = ContentIndex(None if fresh else destination_path) if dedupe else None
+    # Only a resumed merge can have copies that were put in place but not journaled;
+    # sync looks for copies left by an earlier merge the same way
+    adopt = journal is not None and (bool(journal.done) or sync)
+    adopted = set()
+    
+    for folder in folders:
+        yield ("folder", os.path.basename(folder))
+        
+        for directory, entry, error in walk_files(folder, timers):
+            if error is not None:
+                yield ("error", f"Error processing folder '{directory}': {error}")
+                continue
+            
+            file_name = entry.name
+            try:
+                stat = timed_stat(entry, timers)
+                size = stat.st_size
+                operation = plan_journaled(entry, stat, file_name, destination_path, journal, sync, timers)
+                if operation is not None:
+                    yield operation
+                    continue
+                
+                # Don't copy content that's already in the destination under any name
+                if index is not None:
+                    existing = index.find(entry.path, size)
+                    if existing is not None:
+                        yield ("duplicate", entry.path, file_name, os.path.basename(existing))
+                        continue
+                
+                # Just use the filename (flatten the directory structure)
+                if not names.is_taken(file_name):
+                    names.claim(file_name)
+                    new_name, kind, label = file_name, "new", file_name
+                elif not names.is_folder(file_name):
+                    if adopt:
+                        orphan = find_unjournaled_copy(names, journal, destination_path, file_name, stat, adopted)
+                        if orphan is not None:
+                            yield ("skip", file_name if orphan == file_name else f"{file_name} → {orphan}",
+                                   "already merged")
+                            continue
+                    # File exists, create a unique name
+                    new_name = names.claim_unique(file_name)
+                    kind, label = "renamed", f"{file_name} → {new_name}"
+                else:
+                    yield ("skip", file_name, "already exists")
+                    continue
+                
+                destination_file_path = os.path.join(destination_path, new_name)
+                if index is not None:
+                    index.add(entry.path, destination_file_path, size)
+                yield ("copy", entry.path, destination_file_path, label, size, kind, stat.st_mtime_ns)
+            except PermissionError as e:
+                yield ("error", f"Permission error with file '{file_name}': {e}")
+            except Exception as e:
+                yield ("error", f"Error processing file '{file_name}': {e}")
+
+def format_size(size):
+    """Format a byte count for people"""
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if size < 1024 or unit == "TB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def print_plan(plan, options):
+    """Print what a merge would do, with totals, without changing anything; return the error count"""
+    strategy = options["strategy"]
+    files = renamed = replaced = updated = skipped = duplicates = folders_created = errors = 0
+    total_bytes = 0
+    
+    for operation in plan:
+        action = operation[0]
+        if action == "folder":
+            print(f"\nProcessing folder: {operation[1]}")
+        elif action == "mkdir":
+            folders_created += 1
+        elif action == "copy":
+            _, source, destination, label, size, kind, mtime_ns = operation
+            files += 1
+            total_bytes += size
+            if kind == "replaced":
+                replaced += 1
+                print(f"Would replace: {label}")
+            elif kind == "updated":
+                updated += 1
+                print(f"Would update: {label}")
+            elif kind == "renamed":
+                renamed += 1
+                print(f"Would {strategy} with new name: {label}")
+            else:
+                print(f"Would {strategy}: {label}")
+        elif action == "skip":
+            skipped += 1
+            print(f"Would skip ({operation[2]}): {operation[1]}")
+        elif action == "duplicate":
+            duplicates += 1
+            print(f"Would skip (same content as {operation[3]}): {operation[2]}")
+        else:
+            errors += 1
+            print(operation[1])
+    
+    print("\n=== Dry run ===")
+    print(f"Files to {strategy}: {files} ({format_size(total_bytes)})")
+    print(f"  of which renamed: {renamed}, replacing folders: {replaced}, updated: {updated}")
+    print(f"Folders to create: {folders_created}")
+    print(f"Files skipped: {skipped + duplicates}" + (f" ({duplicates} with duplicate content)" if duplicates else ""))
+    print(f"Errors encountered: {errors}")
+    return errors
+
+def execute_plan(plan, destination_path, options, journal=None, reporter=None):
+    """Carry out a merge plan as it is produced and return (copied, replaced, errors)"""
+    if reporter is None:
+        reporter = ProgressReporter(options["log"])
+    manifest = MergeManifest(destination_path) if options["verify"] else None
+    engine = CopyEngine(options["workers"], options["strategy"], journal, reporter, manifest)
+    duplicates = None
+    if options["dedupe"] == "alias":
+        duplicates = open(os.path.join(destination_path, DUPLICATES_FILENAME), "a", encoding="utf-8")
+    total_errors = 0
+    complete = False
+    
+    try:
+        for operation in plan:
+            action = operation[0]
+            if action == "folder":
+                reporter.message(f"Processing folder: {operation[1]}")
+            elif action == "mkdir":
+                started = time.perf_counter()
+                try:
+                    os.makedirs(operation[1], exist_ok=True)
+                except OSError as e:
+                    reporter.error(f"Error creating folder '{operation[1]}': {e}")
+                    total_errors += 1
+                reporter.timers.add("mkdir", time.perf_counter() - started)
+            elif action == "copy":
+                _, source, destination, label, size, kind, mtime_ns = operation
+                engine.copy(source, destination, label, kind, size, mtime_ns)
+            elif action == "skip":
+                reporter.file_skipped(operation[1], operation[2])
+            elif action == "duplicate":
+                _, source, label, existing = operation
+                reporter.file_skipped(label, f"same content as {existing}")
+                if duplicates is not None:
+                    duplicates.write(f"{source}\t{existing}\n")
+            else:
+                reporter.error(operation[1])
+                total_errors += 1
+        complete = True
+    finally:
+        # Let copies already started finish, even when interrupted
+        total_copied, total_replaced, copy_errors = engine.finish()
+        if journal is not None:
+            # Keep it after errors, so running the merge again only retries what failed
+            journal.close(complete and total_errors + copy_errors == 0)
+        if manifest is not None:
+            manifest.close()
+        if duplicates is not None:
+            duplicates.close()
+        reporter.close()
+    
+    return total_copied, total_replaced, total_errors + copy_errors
+
+def execute_archive(plan, archive_path, options, reporter=None):
+    """Write the files of a merge plan into an archive as it is produced and return (added, 0, errors)"""
+    if reporter is None:
+        reporter = ProgressReporter(options["log"])
+    writer = ArchiveWriter(archive_path, options["archive"])
+    added = errors = 0
+    complete = False
+    
+    try:
+        for operation in plan:
+            action = operation[0]
+            if action == "folder":
+                reporter.message(f"Processing folder: {operation[1]}")
+            elif action == "copy":
+                _, source, name, label, size, kind, mtime_ns = operation
+                started = time.perf_counter()
+                try:
+                    writer.add(source, name)
+                except PermissionError as e:
+                    reporter.error(f"Permission error with file '{os.path.basename(source)}': {e}")
+                    errors += 1
+                except OSError as e:
+                    reporter.error(f"Error processing file '{os.path.basename(source)}': {e}")
+                    errors += 1
+                else:
+                    reporter.file_done(label, size, kind)
+                    added += 1
+                reporter.timers.add("copy", time.perf_counter() - started)
+            elif action == "skip":
+                reporter.file_skipped(operation[1], operation[2])
+            elif action == "duplicate":
+                _, source, label, existing = operation
+                reporter.file_skipped(label, f"same content as {existing}")
+            elif action == "error":
+                reporter.error(operation[1])
+                errors += 1
+            # Archives have no folders to create; extracting them creates the folders
+        complete = True
+    finally:
+        writer.close(complete)
+        reporter.close()
+    
+    return added, 0, errors
+
+def run_plan(plan, destination_path, options, journal=None, reporter=None):
+    """Execute a plan, or only print it in a dry run"""
+    if options["dry_run"]:
+        return 0, 0, print_plan(plan, options)
+    if options["archive"]:
+        return execute_archive(plan, destination_path, options, reporter)
+    return execute_plan(plan, destination_path, options, journal, reporter)
+
+def merge_with_structure(base_source_path, destination_path, destination_folder_name, options=None, folders=None):
+    """Merge folders preserving directory structure"""
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    print(f"\n--- Merging with folder structure preserved ---")
+    
+    if folders is None:
         try:
-            for root, dirs, files in os.walk(folder):
-                for file_name in files:
-                    try:
-                        source_file_path = os.path.join(root, file_name)
-
-                        # Get the relative path from base source to the file
-                        relative_path = os.path.relpath(source_file_path, base_source_path)
-
-                        # Construct destination path using that relative structure
-                        destination_file_path = os.path.join(destination_path, relative_path)
-
-                        # Create directory if it doesn't exist
-                        dest_dir = os.path.dirname(destination_file_path)
-                        os.makedirs(dest_dir, exist_ok=True)
-
-                        # If destination file doesn't exist, copy it
-                        if not os.path.exists(destination_file_path):
-                            shutil.copy2(source_file_path, destination_file_path)
-                            print(f"Copied: {relative_path}")
-                            total_copied += 1
-                        else:
-                            # If the existing destination is not a file, replace it
-                            if not os.path.isfile(destination_file_path):
-                                shutil.copy2(source_file_path, destination_file_path)
-                                print(f"Replaced: {relative_path}")
-                                total_replaced += 1
-                            else:
-                                print(f"Skipped (already exists): {relative_path}")
-                                
-                    except PermissionError as e:
-                        print(f"Permission error with file '{file_name}': {e}")
-                        total_errors += 1
-                    except Exception as e:
-                        print(f"Error processing file '{file_name}': {e}")
-                        total_errors += 1
-                        
+            folders = list_source_folders(base_source_path, destination_folder_name)
         except Exception as e:
-            print(f"Error processing folder '{folder}': {e}")
-            total_errors += 1
+            print(f"Error listing directories: {e}")
+            return 0, 0, 1
     
-    return total_copied, total_replaced, total_errors
+    # An archive is always written from scratch, so there's nothing to resume or compare with
+    archive = bool(options["archive"])
+    journal = MergeJournal(destination_path) if not archive else None
+    reporter = ProgressReporter(None if options["dry_run"] else options["log"])
+    if options["count"] and not options["dry_run"]:
+        reporter.count_files(folders)
+    plan = plan_with_structure(base_source_path, "" if archive else destination_path, folders, journal,
+                               options["sync"], reporter.timers, fresh=archive)
+    return run_plan(plan, destination_path, options, journal, reporter)
 
-def merge_contents_only(base_source_path, destination_path, destination_folder_name):
+def merge_contents_only(base_source_path, destination_path, destination_folder_name, options=None, folders=None):
     """Merge only file contents, flattening directory structure"""
+    options = {**DEFAULT_OPTIONS, **(options or {})}
     print(f"\n--- Merging contents only (flattened) ---")
     
-    # Get all folders in the base path except the destination folder
+    if folders is None:
+        try:
+            folders = list_source_folders(base_source_path, destination_folder_name)
+        except Exception as e:
+            print(f"Error listing directories: {e}")
+            return 0, 0, 1
+    
+    archive = bool(options["archive"])
+    journal = MergeJournal(destination_path) if not archive else None
+    reporter = ProgressReporter(None if options["dry_run"] else options["log"])
+    if options["count"] and not options["dry_run"]:
+        reporter.count_files(folders)
+    plan = plan_contents_only(base_source_path, "" if archive else destination_path, folders, options["dedupe"],
+                              journal, options["sync"], reporter.timers, fresh=archive)
+    return run_plan(plan, destination_path, options, journal, reporter)
+
+def verify_destination(destination_path, full=False):
+    """Check a merged folder against its manifest and return (files checked, files hashed, problems)
+    
+    Files whose size and modification time still match the manifest are
+    trusted without being read, unless full is set. Files that changed are
+    hashed again; if their content still matches, the manifest is updated so
+    they aren't hashed next time.
+    """
+    manifest = MergeManifest(destination_path)
+    if not manifest.entries:
+        print(f"No {MANIFEST_FILENAME} found in '{destination_path}'; merge with verify mode on first.")
+        return 0, 0, 0
+    
+    checked = hashed = problems = 0
     try:
-        all_items = os.listdir(base_source_path)
-        folders = [
-            os.path.join(base_source_path, f)
-            for f in all_items
-            if os.path.isdir(os.path.join(base_source_path, f)) and f != destination_folder_name
-        ]
-    except Exception as e:
-        print(f"Error listing directories: {e}")
-        return 0, 0, 1
+        for relative_path, (size, mtime_ns, digest) in list(manifest.entries.items()):
+            file_path = os.path.join(destination_path, relative_path)
+            checked += 1
+            try:
+                stat = os.stat(file_path)
+                if not full and stat.st_size == size and stat.st_mtime_ns == mtime_ns:
+                    continue
+                hashed += 1
+                if stat.st_size != size or full_hash(file_path) != digest:
+                    print(f"Changed: {relative_path}")
+                    problems += 1
+                elif stat.st_mtime_ns != mtime_ns:
+                    # Only the date changed; remember it so the file isn't read again
+                    manifest.record(file_path, stat.st_size, stat.st_mtime_ns, digest)
+            except FileNotFoundError:
+                print(f"Missing: {relative_path}")
+                problems += 1
+            except OSError as e:
+                print(f"Error checking file '{relative_path}': {e}")
+                problems += 1
+    finally:
+        manifest.close()
     
-    total_copied = 0
-    total_replaced = 0
-    total_errors = 0
+    print("\n=== Verification ===")
+    print(f"Files in manifest: {checked}")
+    print(f"Files read and hashed: {hashed}")
+    print(f"Missing or changed: {problems}")
+    return checked, hashed, problems
+
+def check_merged_folder():
+    """Ask for a merged folder and check it against its manifest"""
+    while True:
+        dest_path = input("Enter the merged folder to check: ").strip()
+        if os.path.isdir(dest_path):
+            break
+        print(f"Error: '{dest_path}' is not a directory!")
     
-    for folder in folders:
-        print(f"\nProcessing folder: {os.path.basename(folder)}")
-        
-        try:
-            for root, dirs, files in os.walk(folder):
-                for file_name in files:
-                    try:
-                        source_file_path = os.path.join(root, file_name)
-
-                        # Just use the filename (flatten the directory structure)
-                        destination_file_path = os.path.join(destination_path, file_name)
-
-                        # If destination file doesn't exist, copy it
-                        if not os.path.exists(destination_file_path):
-                            shutil.copy2(source_file_path, destination_file_path)
-                            print(f"Copied: {file_name}")
-                            total_copied += 1
-                        else:
-                            # Handle filename conflicts
-                            if os.path.isfile(destination_file_path):
-                                # File exists, create a unique name
-                                base_name, ext = os.path.splitext(file_name)
-                                counter = 1
-                                original_dest_path = destination_file_path
-                                while os.path.exists(destination_file_path):
-                                    new_name = f"{base_name}_{counter}{ext}"
-                                    destination_file_path = os.path.join(destination_path, new_name)
-                                    counter += 1
-                                
-                                shutil.copy2(source_file_path, destination_file_path)
-                                print(f"Copied with new name: {file_name} → {os.path.basename(destination_file_path)}")
-                                total_copied += 1
-                            else:
-                                print(f"Skipped (already exists): {file_name}")
-                                
-                    except PermissionError as e:
-                        print(f"Permission error with file '{file_name}': {e}")
-                        total_errors += 1
-                    except Exception as e:
-                        print(f"Error processing file '{file_name}': {e}")
-                        total_errors += 1
-                        
-        except Exception as e:
-            print(f"Error processing folder '{folder}': {e}")
-            total_errors += 1
+    while True:
+        answer = input("Hash every file, not just the ones whose size or date changed? (y/n): ").strip().lower()
+        if answer in ("y", "yes", "n", "no"):
+            full = answer in ("y", "yes")
+            break
+        print("Please enter 'y' or 'n'.")
     
-    return total_copied, total_replaced, total_errors
+    checked, hashed, problems = verify_destination(dest_path, full)
+    if checked and problems == 0:
+        print("✅ Every file matches the manifest!")
+    elif problems:
+        print("⚠️  Some files don't match the manifest.")
 
 def merge_folders():
     """Main function to merge folders based on user input"""
     
     # Get user input
-    base_source_path, destination_path, merge_type = get_user_input()
+    base_source_path, destination_path, merge_type, options = get_user_input()
+    run_merge(base_source_path, destination_path, merge_type, options)
+
+def run_merge(base_source_path, destination_path, merge_type, options):
+    """Merge the folders in a source path into a destination and print a summary; return the exit code"""
+    options = {**DEFAULT_OPTIONS, **options}
     
     # Extract destination folder name from path
     destination_folder_name = os.path.basename(destination_path.rstrip('/\\'))
@@ -191,21 +1370,21 @@ def merge_folders():
     # Check if base source path exists
     if not os.path.exists(base_source_path):
         print(f"Error: Base source path '{base_source_path}' does not exist!")
-        return
+        return 1
     
-    # Create destination directory if it doesn't exist
-    os.makedirs(destination_path, exist_ok=True)
+    # Create destination directory (or the archive's folder) if it doesn't exist
+    if options["archive"]:
+        print(f"Writing {options['archive']} archive" + (" to stdout" if destination_path == "-" else ""))
+        if not options["dry_run"] and destination_path != "-":
+            os.makedirs(os.path.dirname(os.path.abspath(destination_path)), exist_ok=True)
+    elif not options["dry_run"]:
+        os.makedirs(destination_path, exist_ok=True)
     print(f"Destination path: {destination_path}")
     print(f"Destination folder name: {destination_folder_name}")
     
     # Get all folders in the base path except the destination folder
     try:
-        all_items = os.listdir(base_source_path)
-        folders = [
-            os.path.join(base_source_path, f)
-            for f in all_items
-            if os.path.isdir(os.path.join(base_source_path, f)) and f != destination_folder_name
-        ]
+        folders = list_source_folders(base_source_path, destination_folder_name)
         
         print(f"Found {len(folders)} folders to process:")
         for folder in folders:
@@ -213,42 +1392,141 @@ def merge_folders():
         
         if not folders:
             print("No folders found to merge!")
-            return
+            return 1
             
     except PermissionError as e:
         print(f"Permission error accessing '{base_source_path}': {e}")
-        return
+        return 1
     except Exception as e:
         print(f"Error listing directories: {e}")
-        return
+        return 1
     
     # Perform merge based on user choice
     if merge_type == "structure":
         total_copied, total_replaced, total_errors = merge_with_structure(
-            base_source_path, destination_path, destination_folder_name
+            base_source_path, destination_path, destination_folder_name, options, folders
         )
     else:  # merge_type == "contents"
         total_copied, total_replaced, total_errors = merge_contents_only(
-            base_source_path, destination_path, destination_folder_name
+            base_source_path, destination_path, destination_folder_name, options, folders
         )
+    if options["dry_run"]:
+        print("Nothing was changed.")
+        return 1 if total_errors else 0
     
     # Print summary
     print(f"\n=== Summary ===")
-    print(f"Files copied: {total_copied}")
-    print(f"Files replaced: {total_replaced}")
+    if options["archive"]:
+        print(f"Files added to the archive: {total_copied}")
+    else:
+        print(f"Files {STRATEGIES[options['strategy']].lower()}: {total_copied}")
+        print(f"Files replaced: {total_replaced}")
     print(f"Errors encountered: {total_errors}")
     
     if total_errors == 0:
         print("✅ Merge completed successfully!")
     else:
         print("⚠️  Merge completed with some errors.")
+    return 1 if total_errors else 0
 
-if __name__ == "__main__":
-    try:
+def run_interactive():
+    """Merge folders, or check an earlier merge, based on user input"""
+    print("=== Folder Merge Script ===\n")
+    print("1. Merge folders (default)")
+    print(f"2. Check a merged folder against its {MANIFEST_FILENAME}")
+    while True:
+        choice = input("Choose option (1 or 2, Enter for 1): ").strip() or "1"
+        if choice in ("1", "2"):
+            break
+        print("Please enter 1 or 2.")
+    print()
+    
+    if choice == "1":
         merge_folders()
+    else:
+        check_merged_folder()
+
+def parse_args(argv=None):
+    """Parse command line arguments for running without prompts"""
+    parser = argparse.ArgumentParser(
+        description="Merge the folders inside a source folder into one folder or archive. "
+                    "Run without arguments for interactive mode."
+    )
+    parser.add_argument("source", nargs="?", help="folder containing the folders to merge")
+    parser.add_argument("destination", nargs="?",
+                        help="folder to merge into, or an archive file (.tar, .tar.gz, .tgz, .tar.bz2, .tar.xz, "
+                             ".zip); '-' writes the archive to stdout")
+    parser.add_argument("--structure", action="store_true",
+                        help="keep the folder structure instead of flattening all files into the destination")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"files to copy at once (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--method", choices=list(STRATEGIES), default="copy",
+                        help="how files get into the destination (default: copy)")
+    parser.add_argument("--dedupe", choices=["skip", "alias"],
+                        help="skip files whose content is already merged (alias also lists them in "
+                             f"{DUPLICATES_FILENAME}); contents merges only")
+    parser.add_argument("--dry-run", action="store_true", help="only list what would be done")
+    parser.add_argument("--sync", action="store_true",
+                        help="copy files again if their size or date changed since they were merged")
+    parser.add_argument("--verify", action="store_true",
+                        help=f"hash files while copying them and list them in {MANIFEST_FILENAME}")
+    parser.add_argument("--log", help="write a JSON line for every file to this file")
+    parser.add_argument("--count", action="store_true",
+                        help="count the source files in the background to show the time left "
+                             "(lists the source folders twice)")
+    parser.add_argument("--archive", choices=list(ARCHIVE_FORMATS),
+                        help="archive format, if it can't be told from the destination's extension (e.g. for '-')")
+    parser.add_argument("--check", metavar="FOLDER", help=f"check a merged folder against its {MANIFEST_FILENAME}")
+    parser.add_argument("--full", action="store_true", help="with --check, hash every file")
+    args = parser.parse_args(argv)
+    
+    if args.source and not args.destination:
+        parser.error("a destination is needed")
+    if args.destination:
+        args.archive = args.archive or archive_format(args.destination)
+        if args.destination == "-" and not args.archive:
+            parser.error("--archive is needed to write an archive to stdout")
+        if args.archive and (args.method != "copy" or args.sync or args.verify):
+            parser.error("--method, --sync and --verify don't apply to archives")
+    return args
+
+def main(argv=None):
+    """Run interactively, or without prompts when paths are given; return the exit code"""
+    args = parse_args(argv)
+    if args.check:
+        checked, hashed, problems = verify_destination(args.check, args.full)
+        return 1 if problems or not checked else 0
+    
+    if not args.source:
+        try:
+            run_interactive()
+        except KeyboardInterrupt:
+            print("\n\nOperation cancelled by user.")
+        except Exception as e:
+            print(f"\nUnexpected error: {e}")
+        
+        input("\nPress Enter to exit...")
+        return 0
+    
+    if args.destination == "-":
+        # Keep messages out of the archive
+        sys.stdout = sys.stderr
+    options = {
+        "workers": max(1, args.workers),
+        "strategy": args.method,
+        "dedupe": args.dedupe,
+        "dry_run": args.dry_run,
+        "sync": args.sync,
+        "log": args.log,
+        "count": args.count,
+        "verify": args.verify,
+        "archive": args.archive,
+    }
+    try:
+        return run_merge(args.source, args.destination, "structure" if args.structure else "contents", options)
     except KeyboardInterrupt:
         print("\n\nOperation cancelled by user.")
-    except Exception as e:
-        print(f"\nUnexpected error: {e}")
-    
-    input("\nPress Enter to exit...")
\ No newline at end of file
+        return 130
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file